@@ -0,0 +1,47 @@
+"""基准测试公共环境：切换到临时数据库，提供建表与造数工具
+
+设置 BENCH_DATABASE_URL 可对 MySQL/PostgreSQL 测试，默认使用临时SQLite库
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from service.api.db import app, db
+
+TMP_DIR = tempfile.mkdtemp()
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('BENCH_DATABASE_URL', 'sqlite:///' + os.path.join(TMP_DIR, 'bench.db'))
+app.config['SQLALCHEMY_BINDS'] = {'order': 'sqlite:///' + os.path.join(TMP_DIR, 'middle.db')}
+
+from service.database.models import ProdInfo, Card, TempOrder
+
+PROD_NAME = '基准测试商品'
+
+
+def out_order_id(i, prefix='BENCH_'):
+    return prefix + str(i).zfill(27 - len(prefix))     # 27位订单号
+
+
+def reset_db():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+
+def add_product(name=PROD_NAME, price_wholesale=None, auto=True):
+    db.session.add(ProdInfo('测试', name, '', 'images/null.png', 1, '', 1.0, price_wholesale, auto, 0, '', True))
+    db.session.commit()
+
+
+def add_cards(count, name=PROD_NAME, prefix='CARD-'):
+    table = Card.__table__
+    for i in range(0, count, 5000):
+        db.session.execute(table.insert(), [{'prod_name': name, 'card': prefix + str(x), 'reuse': False, 'isused': False} for x in range(i, min(i + 5000, count))])
+    db.session.commit()
+
+
+def add_tmp_orders(count, num=1, name=PROD_NAME, prefix='BENCH_'):
+    shop = ProdInfo.query.filter_by(name=name).first()
+    db.session.add_all([TempOrder(out_order_id(i, prefix), name, 'bench', 'bench@example.com', None, num, False, None, shop=shop) for i in range(count)])
+    db.session.commit()
@@ -0,0 +1,89 @@
+"""批量删除耗时：10万行卡密/订单，对比旧版逐条删除与集合式分块删除(含归档)
+
+用法：python benchmarks/bulk_delete.py [行数]
+"""
+import os
+import time
+from datetime import datetime
+
+from bench_env import db, reset_db, add_product, add_cards, out_order_id, TMP_DIR
+from service.database.models import Card, Order
+from service.util.backup.export import CARD_FIELDS, ORDER_FIELDS
+from service.util import bulk
+from service.util.bulk import bulk_delete
+
+bulk.BACKUP_PATH = TMP_DIR     # 归档写入临时目录，不污染public/backups
+
+
+def add_orders(count):
+    rows = [{'out_order_id': out_order_id(i), 'name': '基准测试商品', 'payment': 'bench', 'contact': 'bench@example.com', 'contact_txt': None,
+             'price': 1.0, 'num': 1, 'total_price': 1.0, 'card': 'CARD-' + str(i), 'status': True, 'updatetime': datetime.now()} for i in range(count)]
+    for i in range(0, count, 5000):
+        db.session.execute(Order.__table__.insert(), rows[i:i+5000])
+    db.session.commit()
+
+
+def prepare(rows, used=False):
+    reset_db()
+    add_product()
+    add_cards(rows)
+    if used:
+        db.session.execute(Card.__table__.update().values(isused=True))
+    add_orders(rows)
+    db.session.remove()
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    db.session.remove()
+    print(f'{label:<28} {time.perf_counter() - start:>8.2f}s')
+
+
+def legacy_remove_cards(ids):
+    with db.auto_commit_db():
+        [Card.query.filter_by(id=x).delete() for x in ids]
+
+
+def legacy_delete_all():
+    with db.auto_commit_db():
+        [db.session.delete(x) for x in Card.query.filter_by(isused=True).all()]
+
+
+def legacy_remove_orders():
+    with db.auto_commit_db():
+        for x in Order.query.all():
+            db.session.delete(x)
+
+
+def run(rows=100000):
+    ids = list(range(1, rows + 1))
+    print(f'{rows} 行')
+    prepare(rows)
+    timed('remove_cards 逐条', lambda: legacy_remove_cards(ids))
+    prepare(rows)
+    timed('remove_cards 集合', lambda: bulk_delete(Card, CARD_FIELDS, ids=ids))
+    prepare(rows)
+    timed('remove_cards 集合+归档', lambda: bulk_delete(Card, CARD_FIELDS, ids=ids, archive=True))
+
+    prepare(rows, used=True)
+    timed('delete_all 逐对象', legacy_delete_all)
+    prepare(rows, used=True)
+    timed('delete_all 集合', lambda: bulk_delete(Card, CARD_FIELDS, criteria=(Card.isused == True,)))
+
+    prepare(rows)
+    timed('remove_order(all) 逐对象', legacy_remove_orders)
+    prepare(rows)
+    timed('remove_order(all) 集合', lambda: bulk_delete(Order, ORDER_FIELDS))
+    prepare(rows)
+    result = []
+    timed('remove_order(all) 集合+归档', lambda: result.append(bulk_delete(Order, ORDER_FIELDS, archive=True)))
+    deleted, path = result[0]
+    assert deleted == rows and Order.query.count() == 0
+    print(f'归档文件 {path} {os.path.getsize(path) / 1024:.0f}KB')
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,55 @@
+"""卡密导入速度：生成含重复行的上传文件，对比旧版ORM add_all与流式批量导入的行/秒
+
+用法：python benchmarks/card_import.py [行数] [已有库存数]
+"""
+import io
+import time
+
+from bench_env import db, reset_db, add_product, add_cards, PROD_NAME
+from service.database.models import Card
+from service.util.card.importer import import_cards, read_lines
+
+
+def make_upload(rows, existing):
+    # 前10%与已有库存重复，另有5%行在文件内重复
+    lines = ['CARD-' + str(i) for i in range(existing - rows // 10, existing - rows // 10 + rows)]
+    lines += lines[:rows // 20]
+    return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+
+def legacy_import(data):
+    # 旧版update_card(methord='add')：整体split + set去重 + ORM add_all
+    card = data.decode('utf-8')
+    tmp_cards = list(set(list(filter(None, card.split('\n')))))
+    with db.auto_commit_db():
+        db.session.add_all([Card(PROD_NAME, card=x, isused=0, reuse=False) for x in tmp_cards])
+    return len(tmp_cards)
+
+
+def bench(label, func, data, existing):
+    reset_db()
+    add_product()
+    add_cards(existing)
+    db.session.remove()
+    start = time.perf_counter()
+    result = func(data)
+    cost = time.perf_counter() - start
+    total = Card.query.filter_by(prod_name=PROD_NAME).count()
+    db.session.remove()
+    print(f'{label:<10} {cost:>8.2f}s {len(data.splitlines()) / cost:>12.0f} {total:>10}')
+    return result
+
+
+def run(rows=200000, existing=100000):
+    data = make_upload(rows, existing)
+    print(f'上传 {len(data.splitlines())} 行，已有库存 {existing} 张')
+    print(f'{"":<10} {"耗时":>9} {"行/秒":>12} {"库存总数":>10}')
+    bench('ORM旧版', legacy_import, data, existing)
+    stats = bench('流式导入', lambda x: list(import_cards(PROD_NAME, read_lines(io.BytesIO(x))))[-1], data, existing)
+    print(stats)
+    assert stats['inserted'] == rows - rows // 10, '去重结果不正确'
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,52 @@
+"""并发发卡压力测试：数百个支付回调同时命中同一商品，校验没有卡密被重复发放
+
+用法：python benchmarks/card_race.py [回调数量] [并发线程数]
+"""
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_env import db, reset_db, add_product, add_cards, add_tmp_orders, out_order_id
+from service.database.models import Card, Order
+from service.util.order import handle
+
+
+def run(orders=300, workers=64):
+    cards = orders * 2 // 3     # 卡密少于订单，同时覆盖缺货分支
+    reset_db()
+    add_product()
+    add_cards(cards)
+    add_tmp_orders(orders)
+    db.session.remove()
+    handle.task = lambda data: None     # 关闭通知渠道，只测发卡
+    ids = [out_order_id(i) for i in range(orders)] * 2  # 每个订单回调两次，同时校验幂等
+
+    def notify(x):
+        handle.notify_success(x)
+        db.session.remove()
+
+    start = time.time()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(notify, ids))
+    cost = time.time() - start
+
+    issued = []
+    order_ids = Counter()
+    for order in Order.query.all():
+        order_ids[order.out_order_id] += 1
+        if order.card:
+            issued.extend(order.card.split(','))
+    dup_cards = [k for k, v in Counter(issued).items() if v > 1]
+    dup_orders = [k for k, v in order_ids.items() if v > 1]
+    used = Card.query.filter_by(isused=True).count()
+    print(f'回调 {len(ids)} 次 / 线程 {workers} / 耗时 {cost:.2f}s')
+    print(f'订单 {sum(order_ids.values())} 个，发出卡密 {len(issued)} 张，已用卡密 {used} 张，库存 {cards} 张')
+    assert not dup_cards, f'卡密重复发放: {dup_cards[:10]}'
+    assert not dup_orders, f'订单重复创建: {dup_orders[:10]}'
+    assert len(issued) == used == min(orders, cards), '发出卡密与已用卡密数量不一致'
+    print('OK')
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,56 @@
+"""下单查询数：统计一次get_pay_url从创建临时订单到调用支付网关前执行的SQL条数与耗时
+
+对比旧流程(TempOrder内部查商品、两次detail_json统计库存、提交后按订单号回查)与当前流程；
+支付网关替换为空实现，只测数据库部分
+用法：python benchmarks/checkout.py [请求数]
+"""
+import time
+
+from sqlalchemy import event
+
+from bench_env import db, reset_db, add_product, add_cards, out_order_id
+from service.database.models import TempOrder, ProdInfo
+from service.util.order import create
+
+create.pay_url = lambda payment, name, out_order_id, total_price: {'qr_code': out_order_id}
+queries = [0]
+
+
+@event.listens_for(db.engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    queries[0] += 1
+
+
+def legacy_checkout(out_order_id, name, payment, contact, contact_txt, num):
+    # 旧实现：TempOrder构造时查询商品，价格与auto各调用一次detail_json(各含1~2条卡密统计)
+    shop = ProdInfo.query.filter_by(name=name).first()
+    shop.detail_json()
+    shop.detail_json()
+    with db.auto_commit_db():
+        db.session.add(TempOrder(out_order_id, name, payment, contact, contact_txt, num, False, None, shop=shop))
+    return create.make_pay_url(out_order_id)
+
+
+def bench(label, checkout, prefix, requests):
+    queries[0] = 0
+    start = time.perf_counter()
+    for i in range(requests):
+        assert checkout(out_order_id(i, prefix), '基准测试商品', 'bench', 'bench@example.com', None, 1)
+        db.session.remove()
+    cost = (time.perf_counter() - start) / requests * 1000
+    print(f'{label:<8} {queries[0] / requests:>10.1f} {cost:>10.2f}')
+
+
+def run(requests=500):
+    reset_db()
+    add_product(price_wholesale='9,100#9.9,8.8,7.7')
+    add_cards(1000)
+    db.session.remove()
+    print(f'{"":<8} {"SQL/请求":>10} {"耗时(ms)":>10}')
+    bench('旧流程', legacy_checkout, 'OLD_', requests)
+    bench('当前流程', create.make_tmp_order, 'NEW_', requests)
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:2]])
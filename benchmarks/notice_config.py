@@ -0,0 +1,62 @@
+"""通知配置解析耗时：每个订单完成时task()读取全部Notice配置，对比eval(str(dict))与JSON缓存解析
+
+用法：python benchmarks/notice_config.py [订单数]
+"""
+import ast
+import time
+
+from bench_env import db, reset_db
+from service.database.models import Notice
+from service.util.json_config import load_config, dump_config
+
+NOTICES = [
+    ('邮箱通知', {'sendname': 'no_replay', 'sendmail': 'demo@gmail.com', 'smtp_address': 'smtp.qq.com', 'smtp_port': '465', 'smtp_pwd': 'ZZZZZZZ'}),
+    ('微信通知', {'token': 'AT_nvlYDjev89gV96hBAvUX5HR3idWQwLlA'}),
+    ('TG通知', {'TG_TOKEN': '1290570937:AAHaXA2uOvDoGKbGeY4xVIi5kR7K55saXhs'}),
+    ('短信通知', {'username': 'XXXXXX', 'password': 'YYYYYYY', 'tokenYZM': 'AAAAAAA', 'templateid': 'CCCCCC'}),
+    ('QQ通知', {'Key': 'null'}),
+]
+
+
+def setup(fmt):
+    reset_db()
+    for name, config in NOTICES:
+        db.session.add(Notice(name, fmt(config), '', False, False))
+    db.session.commit()
+    db.session.remove()
+
+
+def bench(orders, to_json):
+    start = time.perf_counter()
+    for _ in range(orders):
+        [to_json(x) for x in Notice.query.filter().all()]
+        db.session.remove()
+    return (time.perf_counter() - start) / orders * 1e6
+
+
+def parse_only(orders, parse, texts):
+    start = time.perf_counter()
+    for _ in range(orders):
+        [parse(x) for x in texts]
+    return (time.perf_counter() - start) / orders * 1e6
+
+
+def run(orders=2000):
+    setup(str)
+    legacy = [x.config for x in Notice.query.all()]
+    before = bench(orders, lambda x: dict(x.__dict__, config=eval(x.config)))   # 旧实现：每次eval
+    setup(dump_config)
+    texts = [x.config for x in Notice.query.all()]
+    after = bench(orders, lambda x: x.to_json())
+    print(f'订单数 {orders}，每单读取 {len(NOTICES)} 条通知配置')
+    print(f'{"":<16} {"每单耗时(us)":>12}')
+    print(f'{"查询+eval":<16} {before:>12.1f}')
+    print(f'{"查询+JSON缓存":<16} {after:>12.1f}')
+    print(f'{"仅eval":<16} {parse_only(orders, eval, legacy):>12.1f}')
+    print(f'{"仅literal_eval":<16} {parse_only(orders, ast.literal_eval, legacy):>12.1f}')
+    print(f'{"仅JSON缓存":<16} {parse_only(orders, load_config, texts):>12.1f}')
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:2]])
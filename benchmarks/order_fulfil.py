@@ -0,0 +1,35 @@
+"""订单发卡耗时：1、100、1000、10000张卡密的批发订单从回调到订单生成的延迟
+
+用法：python benchmarks/order_fulfil.py [重复次数]
+"""
+import time
+
+from bench_env import db, reset_db, add_product, add_cards, add_tmp_orders, out_order_id
+from service.database.models import Order
+from service.util.order import handle
+
+SIZES = [1, 100, 1000, 10000]
+
+
+def run(repeat=3):
+    handle.task = lambda data: None     # 关闭通知渠道，只测发卡
+    print(f'{"卡密数":>8} {"最快(ms)":>10} {"平均(ms)":>10}')
+    for size in SIZES:
+        reset_db()
+        add_product()
+        add_cards(size * repeat)
+        add_tmp_orders(repeat, num=size)
+        costs = []
+        for i in range(repeat):
+            db.session.remove()
+            start = time.perf_counter()
+            handle.notify_success(out_order_id(i))
+            costs.append((time.perf_counter() - start) * 1000)
+            order = Order.query.filter_by(out_order_id=out_order_id(i)).first()
+            assert order and len(order.card.split(',')) == size, '发卡数量不正确'
+        print(f'{size:>8} {min(costs):>10.1f} {sum(costs) / len(costs):>10.1f}')
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,44 @@
+"""批发价格基准：测量PriceTiers与旧版字符串切分实现的单次计价耗时；正确性见tests/test_price.py
+
+用法：python benchmarks/price_tiers.py [计价次数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from service.util.order.price import parse_tiers
+
+
+def legacy_price(pw, num):
+    # 旧版TempOrder.__cal_price__的2/3档逻辑
+    len_pifa = len(pw.split('#')[0].split(','))
+    if len_pifa == 1:
+        if num > int(pw.split('#')[0]):
+            return pw.split('#')[1].split(',')[1]
+        return pw.split('#')[1].split(',')[0]
+    if num <= int(pw.split('#')[0].split(',')[0]):
+        return pw.split('#')[1].split(',')[0]
+    elif num > int(pw.split('#')[0].split(',')[1]):
+        return pw.split('#')[1].split(',')[2]
+    return pw.split('#')[1].split(',')[1]
+
+
+def run(cases=100000):
+    pw, num = '9,100#9.9,8.8,7.7', 50
+    start = time.perf_counter()
+    for _ in range(cases):
+        float(legacy_price(pw, num))
+    before = (time.perf_counter() - start) / cases * 1e6
+    start = time.perf_counter()
+    for _ in range(cases):
+        parse_tiers(pw).price(num)
+    after = (time.perf_counter() - start) / cases * 1e6
+    assert parse_tiers(pw).price(num) == float(legacy_price(pw, num))
+    print(f'单次计价：字符串切分 {before:.2f}us，PriceTiers {after:.2f}us')
+    print('OK')
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,51 @@
+"""二维码渲染基准：对比原make_qr_code与缓存渲染服务每秒生成图片数及图片体积
+
+用法：python benchmarks/qr_render.py [图片数量]
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import qrcode
+from service.util import qr
+
+URL = 'https://qr.alipay.com/bax0{}8jkn0lzexyqpfk2504'
+
+
+def legacy(text):
+    # 原tg_faka.make_qr_code
+    code = qrcode.QRCode(version=3, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=2)
+    code.add_data(text)
+    code.make(fit=True)
+    img = code.make_image(fill_color="black", back_color="white")
+    qr_bytes = io.BytesIO()
+    img.save(qr_bytes, format='PNG')
+    return io.BytesIO(qr_bytes.getvalue())
+
+
+def bench(label, fn, texts):
+    start = time.time()
+    sizes = [fn(x).getbuffer().nbytes for x in texts]
+    cost = time.time() - start
+    print(f'{label:<8} {len(texts) / cost:>10.1f} 张/秒   平均 {sum(sizes) / len(sizes) / 1024:.1f}KB')
+
+
+def run(count=300):
+    texts = [URL.format(i) for i in range(count)]
+    bench('legacy', legacy, texts)
+    mask, qr.QR_MASK = qr.QR_MASK, ''
+    bench('png-auto', qr.qr_file, texts)    # 逐个评分选择掩码
+    qr.QR_MASK = mask
+    qr.render.cache_clear()
+    bench('png', qr.qr_file, texts)     # 首次渲染，固定掩码
+    bench('cached', qr.qr_file, texts)  # 命中缓存
+    bench('svg', lambda x: io.BytesIO(qr.render(x, 'svg')), texts)
+    assert qr.qr_file(texts[0]).getvalue() == qr.render(texts[0])
+    print('OK')
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,53 @@
+"""SQLite并发写入压测：并发创建临时订单(make_tmp_order)并回调发卡(notify_success)
+
+分别在关闭/开启SQLite调优(WAL、busy_timeout等)的子进程中运行，对比吞吐与锁冲突
+用法：python benchmarks/sqlite_load.py [订单数量] [并发线程数]
+"""
+import os
+import sys
+import time
+import subprocess
+
+
+def worker(orders, threads):
+    from concurrent.futures import ThreadPoolExecutor
+    from bench_env import db, reset_db, add_product, add_cards, out_order_id, PROD_NAME
+    from service.database.models import Order
+    from service.util.order import handle, create
+
+    reset_db()
+    add_product()
+    add_cards(orders)
+    db.session.remove()
+    handle.task = lambda data: None     # 关闭通知渠道
+    errors = []
+    handle.log = create.log = errors.append     # 统计失败(含database is locked)
+
+    def checkout(i):
+        # 未知支付方式不会请求第三方接口，只测数据库写入
+        create.make_tmp_order(out_order_id(i), PROD_NAME, 'bench', 'bench@example.com', None, 1)
+        handle.notify_success(out_order_id(i))
+        db.session.remove()
+
+    start = time.time()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(checkout, range(orders)))
+    cost = time.time() - start
+    done = Order.query.count()
+    print(f'{done}/{orders} 单完成，耗时 {cost:.2f}s，{done / cost:.1f} 单/秒，失败 {len(errors)} 次')
+
+
+def main(orders=1000, threads=32):
+    script = os.path.abspath(__file__)
+    for label, flag in [('调优前', '0'), ('调优后', '1')]:
+        print(label, end='：', flush=True)
+        env = dict(os.environ, SQLITE_TUNING=flag)
+        env.pop('BENCH_DATABASE_URL', None)
+        subprocess.run([sys.executable, script, '--worker', str(orders), str(threads)], env=env, check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--worker']:
+        worker(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(*[int(x) for x in sys.argv[1:3]])
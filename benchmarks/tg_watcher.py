@@ -0,0 +1,59 @@
+"""TG支付监视压力测试：数百个买家同时等待支付，校验网关并发受限、回调已发卡的订单提前结束、全部订单最终出队
+
+用法：python benchmarks/tg_watcher.py [买家数量] [查询线程数]
+"""
+import time
+import random
+import threading
+
+from bench_env import db, reset_db, out_order_id
+from service.database.models import Order
+from service.tg.watcher import PayWatcher
+
+LATENCY = 0.02     # 模拟网关查询耗时，秒
+
+
+def run(buyers=300, workers=4):
+    reset_db()
+    watcher = PayWatcher(interval=0.2, timeout=3, workers=workers)
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0, 'checks': 0}
+    paid_at = {out_order_id(i, 'TG_'): time.time() + random.uniform(0.2, 2) for i in range(buyers)}
+    unpaid = set(random.sample(sorted(paid_at), buyers // 10))     # 一成买家不付款，等待超时
+    settled = set(random.sample(sorted(set(paid_at) - unpaid), buyers // 10))  # 一成由支付回调发卡
+    delivered = []
+
+    def check(data):
+        with lock:
+            state['running'] += 1
+            state['checks'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(LATENCY)
+        with lock:
+            state['running'] -= 1
+        return data['out_order_id'] not in unpaid and time.time() >= paid_at[data['out_order_id']]
+
+    for x in settled:
+        db.session.add(Order(x, '基准测试商品', 'bench', 'bench', None, 1, 1, 1, 'CARD', True, None))
+    db.session.commit()
+    db.session.remove()
+
+    watcher.start(check, lambda data: delivered.append(data['out_order_id']))
+    start = time.time()
+    for x in paid_at:
+        watcher.watch({'out_order_id': x})
+    while watcher.pending():
+        time.sleep(0.05)
+    cost = time.time() - start
+
+    print(f'买家 {buyers} / 查询线程 {workers} / 耗时 {cost:.2f}s / 网关查询 {state["checks"]} 次 / 峰值并发 {state["peak"]}')
+    print(f'统计 {watcher.stats}')
+    assert state['peak'] <= workers, '网关查询并发超出限制'
+    assert sorted(delivered) == sorted(set(paid_at) - unpaid - settled), '发卡订单不一致'
+    assert watcher.stats['settled'] == len(settled) and watcher.stats['expired'] == len(unpaid)
+    print('OK')
+
+
+if __name__ == '__main__':
+    import sys
+    run(*[int(x) for x in sys.argv[1:3]])
@@ -11,15 +11,34 @@ from service.api.common import common
 # app.register_blueprint(base)
 from flask_apscheduler import APScheduler
 from service.util.auto_task import clean_tmp_order
+from service.util.card.stock import reconcile_stock
+import os
+from datetime import datetime
 
 bps = [base,admin,common]
 [app.register_blueprint(bp) for bp in bps]
 
+# 支付回调发卡队列
+from service.util.order.queue import start_workers
+start_workers()
+
+# TG发卡webhook模式，需安装python-telegram-bot；默认polling模式不在web进程内启动
+if os.getenv('TG_MODE') == 'webhook':
+    from service.tg.webhook import tg, start_webhook
+    from service.util.log import log
+    app.register_blueprint(tg)
+    try:
+        start_webhook()
+    except Exception as e:
+        log(e)
+
 scheduler = APScheduler()
 # if you don't wanna use a config, you can set options here:
 # scheduler.api_enabled = True
 scheduler.init_app(app)
 scheduler.add_job(func=clean_tmp_order, id='clean_tmp_order', trigger='cron', day_of_week ='0-6',hour = 4,minute = 27,second = 0, replace_existing=True)
+# 库存计数对账，启动时执行一次
+scheduler.add_job(func=reconcile_stock, id='reconcile_stock', trigger='interval', minutes=int(os.getenv('STOCK_RECONCILE_MINUTES', 10)), next_run_time=datetime.now(), replace_existing=True)
 scheduler.start()
 
 @app.errorhandler(404)
@@ -1,11 +1,17 @@
-from service.database.models import creat_table,drop_table,AdminUser
+from service.database.models import creat_table,drop_table,AdminUser,Payment,Plugin,Notice,DailyStats
 from service.config.config import init_db
 from service.api.db import db
+from sqlalchemy import inspect
+from service.util.json_config import dump_config
+from service.util.stats import DAILY_STATS,rebuild_daily_stats
+from service.util.card.stock import reconcile_stock
 # print(os.getenv('MYSQL_HOST'))
 # print(os.getenv('MYSQL_PORT'))
 # print(os.getenv('MYSQL_PASSWORD'))
 # 初始化数据
 import re
+import ast
+import json
 import random
 import string
 
@@ -16,6 +22,7 @@ def new_table():
     creat_table()
     # 初始化表
     init_db()    
+    reconcile_stock()   # 生成库存计数
 
 def init():
     mod_key() # 熵增
@@ -29,6 +36,7 @@ def init():
         res = False
     if res:
         print('检测到已存在数据库')
+        migrate()
     else:
         try:
             new_table()
@@ -37,6 +45,42 @@ def init():
             print(e)
             print('初始化失败,请检查数据库设置、防火墙、以及是否初始化完成')
 
+def migrate():
+    # 旧数据库升级：补建新增的表和索引，可重复执行
+    db.create_all()
+    migrate_indexes()
+    migrate_configs()
+    if DAILY_STATS and not DailyStats.query.first():
+        rebuild_daily_stats()   # 汇总表为新建，按历史订单补齐
+    reconcile_stock()   # 补齐库存计数表
+
+def migrate_indexes():
+    inspector = inspect(db.engine)
+    for table in db.get_tables_for_bind():  # 默认库，不含order中间库
+        exists = [x['name'] for x in inspector.get_indexes(table.name)]
+        for index in table.indexes:
+            if index.name not in exists:
+                index.create(bind=db.engine)
+                print(f'已添加索引{index.name}')
+
+def migrate_configs():
+    # 旧版配置以str(dict)存储，统一转为JSON；已是JSON的行跳过
+    with db.auto_commit_db():
+        for model in (Payment, Plugin, Notice):
+            for row in model.query.all():
+                if row.config is None:
+                    continue
+                try:
+                    json.loads(row.config)
+                    continue
+                except ValueError:
+                    pass
+                try:
+                    row.config = dump_config(ast.literal_eval(row.config))
+                    print(f'已转换配置{model.__tablename__}:{row.name}')
+                except (ValueError, SyntaxError):   # 无法解析的配置保持原样，不中断其余行的迁移
+                    print(f'配置无法解析，已跳过{model.__tablename__}:{row.name}')
+
 def ranstr(num):
     return ''.join(random.sample(string.ascii_letters + string.digits, num))
 
@@ -1,8 +1,9 @@
 from flask import Blueprint, Response, render_template, request, jsonify, redirect, url_for,make_response
 from sqlalchemy.sql import func
-from service.database.models import AdminUser,AdminLog,Config, Notice, Payment, Plugin,ProdCag,ProdInfo,Card,Order,TempOrder
+from service.database.models import AdminUser,AdminLog,Config, Notice, Payment, Plugin,ProdCag,ProdInfo,Card,Order,TempOrder,TempOrderArchive,NotifyTask,count_stock
 from service.api.db import db,limiter
 from service.util.backup.sql import main_back,loc_sys_back,loc_shop_back,loc_order_back,order_backup_sql,update_order   #备份操作
+from service.util.backup.export import FORMATS,ORDER_FIELDS,CARD_FIELDS,order_query,card_query,parse_day,export_response,text_response   #流式导出
 
 import bcrypt
 # 添加jwt
@@ -15,14 +16,25 @@ import os
 from datetime import datetime, timedelta
 #日志记录
 from service.util.log import log
+from service.util.catalog import catalog
+from service.util.pay import pay_config
+from service.util.json_config import dump_config
 from service.util.message.smtp import mail_test
+from service.util.card.importer import start_import,import_status
+from service.util.card.stock import refresh_stock,card_products
+from service.util.paginate import keyset,page_size,approx_count,parse_cursor,parse_flag,invalidate_count
+from service.util.bulk import bulk_delete
+from service.util.stats import order_series,rebuild_daily_stats,unrecord_order,DAILY_STATS
+from service.util.timeutil import window,day_range,in_range
+from service.util.order.queue import queue_stats    #发卡队列
+from service.util.order.events import order_events
+from service.tg.watcher import pay_watcher  #TG待支付订单
+from service.util.auto_task import gc_stats     #临时订单清理
 
 # 图片公共路径
 UPLOAD_PATH = os.path.join(os.path.dirname(__file__),'../../public/images')
 
 
-NOW = datetime.utcnow()+timedelta(hours=8)
-
 #异步操作
 from concurrent.futures import ThreadPoolExecutor
 executor = ThreadPoolExecutor(2)
@@ -120,34 +132,29 @@ def upload():
 @jwt_required
 def dashboard():
     info = {}
-    info['cag_num'] = len(ProdCag.query.filter().all()) #总分类
-    info['shop_num'] = len(ProdInfo.query.filter().all())  #总商品
-    info['card_num'] = len(Card.query.filter().all())  #总卡密
-    info['order_num'] = len(Order.query.filter().all()) #总订单
     try:
-        info['total_income'] = round(Order.query.with_entities(func.sum(Order.total_price)).scalar(),2)    #总收入
-        info['total_num'] = int(Order.query.with_entities(func.sum(Order.num)).scalar())   #总销售数量--mysql模式下<Decimal('6')
-    except:
-        info['total_income'] = '0.00'
-        info['total_num'] = 0
-    # # 历史数据获取
-    orders = Order.query.filter(Order.updatetime >= NOW - timedelta(days=7)).all()
-    info['history_date'],info['history_price'] = sort_count([(x.updatetime.strftime('%Y-%m-%d'),x.total_price) for x in orders])
+        info['cag_num'] = db.session.query(func.count(ProdCag.id)).scalar() #总分类
+        info['shop_num'] = db.session.query(func.count(ProdInfo.id)).scalar()  #总商品
+        info['card_num'] = db.session.query(func.count(Card.id)).scalar()  #总卡密
+        info['order_num'], total_income, total_num = db.session.query(func.count(Order.id), func.sum(Order.total_price), func.sum(Order.num)).one() #总订单
+        info['total_income'] = round(total_income or 0,2)    #总收入
+        info['total_num'] = int(total_num or 0)   #总销售数量--mysql模式下<Decimal('6')
+        # # 历史数据获取
+        info['history_date'],info['history_price'] = order_series('%Y-%m-%d', '%Y-%m-%d', window(days=7)[0])
+    except Exception as e:
+        log(e)
+        return '数据库异常', 500
     return jsonify(info)    
 
-def sort_count(temp):
-    # temp = [('2021-04-26', 0.9), ('2021-04-26', 1.97), ('2021-04-26', 0.9), ('2021-04-27', 1.9)]
-    date = []
-    price = []
-    for v in temp:
-        if v[0] not in date:
-            date.append(v[0])
-            price.append(v[1])
-            continue
-        price[-1] += v[1]
-
-    return date,price    
 
+# 统计区间：天数(0为全部)、分组粒度、标签格式
+INCOM_WINDOWS = {
+    1: (1, '%Y-%m-%d %H', '%H'),   #天内数据以小时统计
+    2: (7, '%Y-%m-%d', '%d'),      #周内数据以天时统计
+    3: (30, '%Y-%m-%d', '%d'),     #月内数据以天时统计
+    4: (365, '%Y-%m', '%m'),       #年内数据以月时统计
+    5: (0, '%Y-%m-%d', '%d'),      #全部数据以天时统计
+}
 
 @admin.route('/incom_count', methods=['get'])
 @jwt_required
@@ -155,42 +162,20 @@ def incom_count():
     id = request.args.get('id',None)
     if not id:
         return '参数丢失', 400 
-    # if name not in ['1','2','3','4','5']: # 天、周、月、年、全部
     try:
         id = int(id)
-        if id not in [1,2,3,4,5]: # 天、周、月、年、全部
-            return '参数丢失', 400 
-        info = {}
-
-        if id == 1:   #天
-            # orders = Order.query.filter_by((Order.updatetime <= NOW - timedelta(days=1))).all()
-            days = 1
-            # Scrapy.query.filter(Scrapy.date <= NOW - timedelta(days=1)).all()
-            ftime = '%H'  #天内数据以小时统计
-        elif id ==2:  #周
-            days = 7
-            ftime = '%d'  #周内数据以天时统计
-        elif id == 3: #月
-            days = 30
-            ftime = '%d'  #月内数据以天时统计
-        elif id == 4: #年
-            days = 365
-            ftime = '%m'  #年内数据以月时统计
-        elif id == 5: #全部
-            days = 0
-            ftime = '%d'  #全部数据以天时统计
-        else:
-            return '参数丢失', 400        
-        if days !=0:
-            # print(id)
-            orders = Order.query.filter(Order.updatetime >= NOW - timedelta(days=days)).all()
-        else:
-            # orders = Order.query.filter(Order.updatetime >= NOW - timedelta(hours=0.5)).all()
-            orders = Order.query.filter().all()  
+    except:
+        return '参数丢失', 400
+    if id not in INCOM_WINDOWS: # 天、周、月、年、全部
+        return '参数丢失', 400 
+    days, group, label = INCOM_WINDOWS[id]
+    since = window(days=days)[0] if days else None   # 每次请求按当前时间计算区间
+    info = {}
+    try:
+        info['history_date'],info['history_price'] = order_series(group, label, since)
     except Exception as e:
         log(e)
         return '数据库异常', 500    
-    info['history_date'],info['history_price'] = sort_count([(x.updatetime.strftime(ftime),x.total_price) for x in orders])    
     return jsonify(info)
 
 @admin.route('/get_smtp', methods=['get'])
@@ -213,7 +198,7 @@ def update_smtp():
     # 密码加密存储
     try:
         with db.auto_commit_db():
-            Notice.query.filter_by(id =1).update({'config':str(data['config'])})
+            Notice.query.filter_by(id =1).update({'config':dump_config(data['config'])})
     except Exception as e:
         log(e)
         return '数据库异常', 500      
@@ -259,7 +244,7 @@ def update_sms():
     # 密码加密存储
     try:
         with db.auto_commit_db():
-            Notice.query.filter_by(name = '短信通知').update({'config':str(data['config'])})
+            Notice.query.filter_by(name = '短信通知').update({'config':dump_config(data['config'])})
     except Exception as e:
         log(e)
         return '数据库异常', 500      
@@ -320,6 +305,7 @@ def update_class():
         return '数据库异常', 500        
 
     # 重定向登录界面
+    catalog.invalidate()   # 前台目录缓存失效
     return '修改成功', 200
 
 @admin.route('/get_class', methods=['get']) #分类查询
@@ -338,10 +324,11 @@ def get_class():
 def get_shop():
     try:
         prod_shops = ProdInfo.query.filter().all()
+        stock = count_stock()
     except Exception as e:
         log(e)
         return '数据库异常', 500        
-    return jsonify([x.admin_json() for x in prod_shops])   
+    return jsonify([x.admin_json(stock) for x in prod_shops])   
 
 @admin.route('/get_shop_edit', methods=['post']) #商品全部信息返回
 @jwt_required
@@ -402,15 +389,54 @@ def update_shop():
         return '数据库异常', 500      
 
     # 
+    catalog.invalidate()   # 前台目录缓存失效
     return '修改成功', 200
 
+def order_filter(model):
+    # 订单筛选条件：商品名、状态、日期区间(含结束当天)
+    name = request.json.get('name',None)
+    status = parse_flag(request.json.get('status',None))
+    start = parse_day(request.json.get('start',None))
+    end = parse_day(request.json.get('end',None))
+    query = model.query
+    if name:
+        query = query.filter(model.name == name)
+    if status is not None:
+        query = query.filter(model.status == status)
+    query = in_range(query, model.updatetime, *day_range(start, end))
+    return query, {'name':name,'status':status,'start':start,'end':end}
+
+def list_page(query, column, to_json, table, filters, desc=True):
+    # 返回 {data:本页, cursor:下一页游标(无则null), total:近似总数}
+    try:
+        cursor = parse_cursor(request.json.get('cursor',None))
+    except ValueError:
+        return '游标格式错误', 400
+    try:
+        rows, cursor = keyset(query, column, cursor, page_size(request.json.get('size',None)), desc)
+        total = approx_count(query, table, filters)
+    except Exception as e:
+        log(e)
+        return '数据库异常', 500
+    return jsonify({'data':[to_json(x) for x in rows],'cursor':cursor,'total':total})
+
 @admin.route('/get_card', methods=['post']) #卡密查询
 @jwt_required
 def get_card():
     # print(request.json)
     page = request.json.get('page',None)
-    if not page:
-        return 'Missing data1', 400
+    if not page:    # 不传page为游标分页：cursor、size、prod_name、isused
+        prod_name = request.json.get('prod_name',None)
+        try:
+            isused = parse_flag(request.json.get('isused',None))
+        except ValueError:
+            return '筛选参数错误', 400
+        query = Card.query
+        if prod_name:
+            query = query.filter(Card.prod_name == prod_name)
+        if isused is not None:
+            query = query.filter(Card.isused == isused)
+        return list_page(query, Card.id, lambda x:x.to_json(), Card.__tablename__, {'prod_name':prod_name,'isused':isused}, desc=False)
     try:
         cards = Card.query.filter().offset((int(page)-1)*20).limit(20).all()
         
@@ -423,7 +449,7 @@ def get_card():
 @jwt_required
 def get_card_pages():
     try:
-        nums = Card.query.filter().count()
+        nums = approx_count(Card.query, Card.__tablename__)
         temp = nums//20
         if nums%20:
             pages = temp+1
@@ -448,20 +474,25 @@ def update_card():
         return 'Missing methord', 400
     # 调用smtp函数发送邮件
     try:
+        if methord == 'delete_all':     # 删除全部已使用卡密，分块提交，不放在同一事务内
+            bulk_delete(Card, CARD_FIELDS, criteria=(Card.isused == True,), archive=request.json.get('archive', False))
+            catalog.invalidate()
+            invalidate_count(Card.__tablename__)
+            return '修改成功', 200
         with db.auto_commit_db():
             if methord == 'update':
                 if not all([id,prod_name,card]):
                     return 'Missing data 1', 400
+                old_name = db.session.query(Card.prod_name).filter_by(id = id).scalar()
                 Card.query.filter_by(id = id).update({'prod_name':prod_name,'card':card,'isused':isused,'reuse':reuse})
+                refresh_stock([old_name,prod_name])   # 库存计数同事务更新
             elif methord == 'delete':
                 if not id:
                     return 'Missing data', 400
+                old_name = db.session.query(Card.prod_name).filter_by(id = id).scalar()
                 Card.query.filter_by(id = id).delete()
+                refresh_stock([old_name])
             # elif methord == 'add':
-            elif methord == 'delete_all':
-                res = Card.query.filter_by(isused = True).all()
-                if res:
-                    [db.session.delete(x) for x in res]
             else:
                 if not all([prod_name,card]):
                     return 'Missing data', 400
@@ -470,7 +501,10 @@ def update_card():
                 if len(tmp_cards) >1:
                     reuse = False
                 db.session.add_all([Card(prod_name,card=x,isused=0,reuse=reuse) for x in tmp_cards])
+                refresh_stock([prod_name], restock=True)
         # 重定向登录界面
+        catalog.invalidate()   # 前台目录缓存失效
+        invalidate_count(Card.__tablename__)    # 卡密数量变化，列表计数缓存失效
         return '修改成功', 200          
     except Exception as e:
         log(e)
@@ -480,14 +514,49 @@ def update_card():
 
 
 
+@admin.route('/import_cards', methods=['post']) #批量导入卡密，multipart上传txt/csv
+@jwt_required
+def import_cards_api():
+    prod_name = request.form.get('prod_name', None)
+    file = request.files.get('file', None)
+    if not all([prod_name,file]):
+        return 'Missing data', 400
+    if not ProdInfo.query.filter_by(name = prod_name).first():
+        return '商品不存在', 404
+    csv_mode = (file.filename or '').lower().endswith('.csv')
+    try:
+        job_id = start_import(prod_name, file.stream, csv_mode)    # 后台导入，返回任务ID
+    except Exception as e:
+        log(e)
+        return '上传失败', 500
+    return jsonify({'job':job_id}), 202
+
+@admin.route('/import_cards/<job_id>', methods=['get']) #导入进度，done为True时结束
+@jwt_required
+def import_cards_status(job_id):
+    info = import_status(job_id)
+    if not info:
+        return '任务不存在', 404
+    return jsonify(info)
+
+
 @admin.route('/remove_cards', methods=['post']) #批量删除卡密
 @jwt_required
 def remove_cards():
     ids = request.json.get('ids', None)
+    archive = request.json.get('archive', False)   # 删除前归档到backups目录
     if not ids:
         return 'Missing Data', 400
-    with db.auto_commit_db():        
-        [Card.query.filter_by(id = x).delete() for x in ids]    
+    try:
+        names = card_products(ids)
+        bulk_delete(Card, CARD_FIELDS, ids=ids, archive=archive)
+        with db.auto_commit_db():
+            refresh_stock(names)   # 分块删除完成后重新统计，中途失败由定时对账修复
+    except Exception as e:
+        log(e)
+        return '数据库异常', 500
+    catalog.invalidate()   # 前台目录缓存失效
+    invalidate_count(Card.__tablename__)
     return '批量删除', 200    
 
 
@@ -495,8 +564,12 @@ def remove_cards():
 @jwt_required
 def get_orders():
     page = request.json.get('page',None)
-    if not page:
-        return 'Missing data1', 400
+    if not page:    # 游标分页：cursor、size、name、status、start、end
+        try:
+            query, filters = order_filter(Order)
+        except ValueError:
+            return '筛选参数错误', 400
+        return list_page(query, Order.id, lambda x:x.admin_json(), Order.__tablename__, filters)
     try:
         orders = Order.query.order_by(Order.id.desc()).offset((int(page)-1)*20).limit(20).all()
     except Exception as e:
@@ -508,8 +581,12 @@ def get_orders():
 @jwt_required
 def get_tmp_orders():
     page = request.json.get('page',None)
-    if not page:
-        return 'Missing data1', 400
+    if not page:    # 游标分页：cursor、size、name、status、start、end
+        try:
+            query, filters = order_filter(TempOrder)
+        except ValueError:
+            return '筛选参数错误', 400
+        return list_page(query, TempOrder.id, lambda x:x.to_json2(), TempOrder.__tablename__, filters)
     try:
         # orders = TempOrder.query.filter().offset((int(page)-1)*20).limit(20).all()
         orders = TempOrder.query.order_by(TempOrder.id.desc()).offset((int(page)-1)*20).limit(20).all()
@@ -525,13 +602,16 @@ def remove_order():
     if not id:
         return 'Missing Data', 400
     try:
-        with db.auto_commit_db():
-            if id == "all":
-                orders = Order.query.all()
-                for x in orders:
-                    db.session.delete(x)
-            else:
-                Order.query.filter_by(id = id).delete()
+        if id == "all":
+            bulk_delete(Order, ORDER_FIELDS, archive=request.json.get('archive', False))
+            if DAILY_STATS:
+                rebuild_daily_stats()   # 订单清空，重建按天汇总
+        else:
+            with db.auto_commit_db():   # 按天汇总与删除同一事务，只扣减该订单所在日期
+                order = db.session.query(Order.updatetime,Order.num,Order.total_price).filter_by(id = id).first()
+                if order and Order.query.filter_by(id = id).delete():
+                    unrecord_order(*order)
+        invalidate_count(Order.__tablename__)
         return '删除成功', 200    
     except Exception as e:
         log(e)
@@ -541,7 +621,7 @@ def remove_order():
 @jwt_required
 def get_orders_pages():
     try:
-        nums = Order.query.filter().count()
+        nums = approx_count(Order.query, Order.__tablename__)
         temp = nums//20
         if nums%20:
             pages = temp+1
@@ -556,7 +636,7 @@ def get_orders_pages():
 @jwt_required
 def get_tmp_orders_pages():
     try:
-        nums = TempOrder.query.filter().count()
+        nums = approx_count(TempOrder.query, TempOrder.__tablename__)
         temp = nums//20
         if nums%20:
             pages = temp+1
@@ -590,7 +670,9 @@ def update_pays():
                 return 'Missing Data', 400
             # print(type(data['config']))
             with db.auto_commit_db():
-                Payment.query.filter_by(id = data['id']).update({'icon':data['icon'],'config':str(data['config']),'isactive':data['isactive']})
+                Payment.query.filter_by(id = data['id']).update({'icon':data['icon'],'config':dump_config(data['config']),'isactive':data['isactive']})
+            catalog.invalidate()   # 前台目录缓存失效
+            pay_config.invalidate()   # 支付配置及网关对象缓存失效
             return '修改成功', 200 
     except Exception as e:
         log(e)
@@ -621,7 +703,7 @@ def update_notice():
                 if old_data[i] == index:
                     pass    #数据未更新
                 else:
-                    Notice.query.filter_by(id = index['id']).update({'config':str(index['config']),'admin_account':index['admin_account'],'admin_switch':index['admin_switch'],'user_switch':index['user_switch']})
+                    Notice.query.filter_by(id = index['id']).update({'config':dump_config(index['config']),'admin_account':index['admin_account'],'admin_switch':index['admin_switch'],'user_switch':index['user_switch']})
     except Exception as e:
         log(e)
         return '数据库异常', 500        
@@ -662,12 +744,43 @@ def update_system():
         return '参数丢失', 400
     with db.auto_commit_db():
         Config.query.filter_by(id = data['id']).update({'info':data['info']})
+    catalog.invalidate()   # 前台目录缓存失效
+    pay_config.invalidate()   # 支付配置及网关对象缓存失效
     return {"mgs": 'success'}, 200
 
 
 
 
 
+@admin.route('/pool_status', methods=['GET']) #数据库连接池监控
+@jwt_required
+def pool_status():
+    return jsonify(db.pool_status())
+
+@admin.route('/notify_queue', methods=['GET']) #发卡队列监控
+@jwt_required
+def notify_queue():
+    try:
+        info = queue_stats()
+        info['pay_waiting'] = order_events.waiting()   # 等待支付结果的连接数
+        info['tg_watching'] = pay_watcher.pending()     # TG待支付订单数
+        info['dead_tasks'] = [x.to_json() for x in NotifyTask.query.filter_by(status = 'dead').order_by(NotifyTask.id.desc()).limit(20).all()]
+    except Exception as e:
+        log(e)
+        return '数据库异常', 500
+    return jsonify(info)
+
+@admin.route('/gc_status', methods=['GET']) #临时订单清理监控
+@jwt_required
+def gc_status():
+    try:
+        info = dict(gc_stats)
+        info['archives'] = [x.to_json() for x in TempOrderArchive.query.order_by(TempOrderArchive.id.desc()).limit(20).all()]
+    except Exception as e:
+        log(e)
+        return '数据库异常', 500
+    return jsonify(info)
+
 @admin.route('/backups',methods=['POST'])
 @jwt_required
 def backups():
@@ -685,22 +798,41 @@ def local_backup():
         types = int(types)
     except:
         return  '需要int参数', 400
-    if not types or types not in [1,2,3,4,5]:
+    if not types or types not in [1,2,3,4,5,6,7]:
         return '参数丢失', 400
+    # 导出筛选：format=csv/ndjson，gzip=1压缩，start/end日期(YYYY-MM-DD，含当天)，name商品名
+    fmt = request.args.get('format','csv')
+    gz = request.args.get('gzip','0') in ['1','true']
+    name = request.args.get('name',None)
+    if fmt not in FORMATS:
+        return '不支持的导出格式', 400
+    try:
+        start = parse_day(request.args.get('start',None))
+        end = parse_day(request.args.get('end',None))
+    except ValueError:
+        return '日期格式错误', 400
     try:
         if types == 1:
             # 支付邮箱系统配置
             msg = loc_sys_back()
         elif types == 2:
             # 卡密备份
-            msg = loc_shop_back()
+            return text_response(loc_shop_back(name), '4545', gz)
         elif types == 3:
             # 历史订单备份
-            msg = loc_order_back()
+            return text_response(loc_order_back(start, end, name), '4545', gz)
         elif types == 4:
             msg = order_backup_sql()
         elif types == 5:
             msg = update_order()
+            if DAILY_STATS:
+                rebuild_daily_stats()   # 订单表已替换，重建按天汇总
+        elif types == 6:
+            # 订单导出 CSV/NDJSON
+            return export_response(order_query(start, end, name), ORDER_FIELDS, 'orders', fmt, gz)
+        elif types == 7:
+            # 未使用卡密导出 CSV/NDJSON
+            return export_response(card_query(name, isused=False), CARD_FIELDS, 'cards', fmt, gz)
         else:
             msg = 'ok'
         if msg != 'ok':
@@ -725,7 +857,7 @@ def tg_info():
         if not data:    # 传递TG_token,switc,about
             return '参数丢失', 400
         with db.auto_commit_db():
-            Plugin.query.filter_by(name = 'TG发卡').update({'config':str(data['config']),'about':data['about'],'switch':data['switch']})
+            Plugin.query.filter_by(name = 'TG发卡').update({'config':dump_config(data['config']),'about':data['about'],'switch':data['switch']})
         return '数据更新成功', 200 
 
 @admin.route('/theme',methods=['GET','POST'])
@@ -741,6 +873,7 @@ def theme():
         if data in ['list','taobao','gongge']:
             with db.auto_commit_db():
                 Config.query.filter_by(name = 'theme').update({'info':data})
+            catalog.invalidate()   # 前台目录缓存失效
             return '数据更新成功', 200
         return '更新失败', 400
 
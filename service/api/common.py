@@ -5,7 +5,7 @@ import time
 import os
 from service.database.models import TempOrder
 
-from service.util.order.handle import notify_success
+from service.util.order.queue import enqueue   #持久化发卡队列
 
 from flask.helpers import make_response
 from service.util.pay.alipay.alipayf2f import   AlipayF2F
@@ -20,6 +20,7 @@ from service.util.pay.yungouos.yungou import YunGou
 from service.util.pay.vmq.vmpay import VMQ  # V免签
 from service.util.pay.codepay.codepay import CodePay
 from service.util.pay.yunmq.ymq import Ymq  # 云免签
+from service.util.pay.registry import gateway   # 网关对象缓存
 
 common = Blueprint('common', __name__)
 # common = Blueprint('common', __name__,static_folder='../../dist/static',template_folder='../../dist/admin')
@@ -53,12 +54,16 @@ def favicon():
 
 # 图片公共路径
 UPLOAD_PATH = os.path.join(os.path.dirname(__file__),'../../public/images')
-
+# 静态资源缓存策略：图片带ETag/Last-Modified协商；首页每次协商，保证前端发版后及时生效
+IMAGES_CACHE_CONTROL = os.getenv('IMAGES_CACHE_CONTROL', 'public, max-age=3600, stale-while-revalidate=86400')
+INDEX_CACHE_CONTROL = os.getenv('INDEX_CACHE_CONTROL', 'no-cache')
 
 
 @common.route('/images/<filename>')
 def get_file(filename):
-    return send_from_directory(UPLOAD_PATH,filename)
+    resp = send_from_directory(UPLOAD_PATH,filename,conditional=True)
+    resp.headers['Cache-Control'] = IMAGES_CACHE_CONTROL
+    return resp
 
 # def notify_success(out_order_id):
 #     print(f'{out_order_id}订单处理完毕')
@@ -67,7 +72,10 @@ def get_file(filename):
 @common.route('/')
 def index():
     # return '恭喜，后端部署成功'
-    return render_template('index.html')
+    resp = make_response(render_template('index.html'))
+    resp.add_etag()
+    resp.headers['Cache-Control'] = INDEX_CACHE_CONTROL
+    return resp.make_conditional(request)
     # return """<style type="text/css">*{ padding: 0; margin: 0; } div{ padding: 4px 48px;} a{color:#2E5CD5;cursor:
     # pointer;text-decoration: none} a:hover{text-decoration:underline; } body{ background: #fff; font-family:
     # "Century Gothic","Microsoft yahei"; color: #333;font-size:18px;} h1{ font-size: 100px; font-weight: normal;
@@ -96,10 +104,10 @@ def notify(name):
         if name == 'alipay':
             trade_status = request.form.get('trade_status', None)
             if trade_status and trade_status == 'TRADE_SUCCESS':
-                res = AlipayF2F().verify(request.form.to_dict())
+                res = gateway(AlipayF2F).verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('out_trade_no', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'wechat':
             try:
                 xml = request.data
@@ -110,10 +118,10 @@ def notify(name):
                     array_data[child.tag] = value
                 return_code = array_data['return_code']
                 if return_code == 'SUCCESS':
-                    res = Wechat().verify(array_data)
+                    res = gateway(Wechat).verify(array_data)
                     if res:
                         out_order_id = array_data['out_trade_no']
-                        executor.submit(notify_success,out_order_id)
+                        enqueue(out_order_id)
             except:
                 pass
         elif name == 'xunhupay':
@@ -121,33 +129,33 @@ def notify(name):
             if trade_status and trade_status == 'OD':
                 plugins = request.form.get('plugins', None)
                 if plugins and plugins.find('wechat') !=-1:
-                    res = Hupi(payment='wechat').verify(request.form.to_dict())
+                    res = gateway(Hupi, payment='wechat').verify(request.form.to_dict())
                 else:
-                    res = Hupi(payment='alipay').verify(request.form.to_dict())
+                    res = gateway(Hupi, payment='alipay').verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('trade_order_id', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'payjs':
             trade_status = request.form.get('return_code',None)
             if trade_status and trade_status == '1':
                 attach = request.form.get('attach', None)
                 if attach and attach.find('wechat') !=-1:
-                    res = Payjs(payment='wechat').verify(request.form.to_dict())
+                    res = gateway(Payjs, payment='wechat').verify(request.form.to_dict())
                 else:
-                    res = Payjs(payment='alipay').verify(request.form.to_dict())
+                    res = gateway(Payjs, payment='alipay').verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('out_trade_no', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'vmq':
             out_order_id = request.args.get('payId', None)
             if out_order_id and len(out_order_id) == 27:
                 payUrl = request.args.get('payUrl', None)
                 if payUrl and payUrl.find('alipay') != -1:  # find找不着是返回-1
-                    res = VMQ(payment='alipay').verify(request.args.to_dict())
+                    res = gateway(VMQ, payment='alipay').verify(request.args.to_dict())
                 else:
-                    res = VMQ(payment='wechat').verify(request.args.to_dict())
+                    res = gateway(VMQ, payment='wechat').verify(request.args.to_dict())
                 if res:
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'epay':
             trade_status = request.args.get('trade_status', None)
             if trade_status and trade_status == 'TRADE_SUCCESS':
@@ -158,25 +166,25 @@ def notify(name):
                     payment = 'wechat'
                 else:
                     payment = 'qqpay'
-                res = Epay(payment).verify(request.args.to_dict())
+                res = gateway(Epay, payment).verify(request.args.to_dict())
                 if res:
                     out_order_id = request.args.get('out_trade_no', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'yungou':
             code = request.form.get('code', None)
             if code == '1':
-                res = YunGou().verify(request.form.to_dict())
+                res = gateway(YunGou).verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('outTradeNo', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
                     return 'SUCCESS'    # 特有属性
         elif name == 'yungouwx':
             code = request.form.get('code', None)
             if code == '1':
-                res = YunGou(payment = 'wechat').verify(request.form.to_dict())
+                res = gateway(YunGou, payment = 'wechat').verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('outTradeNo', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
                     return 'SUCCESS'    # 特有属性
         elif name == 'codepay':
             pay_type = request.form.get('type', None)
@@ -187,10 +195,10 @@ def notify(name):
                     payment = 'qqpay'
                 elif pay_type == '1':
                     payment = 'alipay'
-                res = CodePay(payment).verify(request.form.to_dict())
+                res = gateway(CodePay, payment).verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('pay_id', None)
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'qqpay':
             try:
                 xml = request.data
@@ -202,26 +210,26 @@ def notify(name):
                 # print(array_data)
                 trade_state = array_data['trade_state']
                 if trade_state == 'SUCCESS':
-                    res = QQpay().verify(array_data)
+                    res = gateway(QQpay).verify(array_data)
                     if res:
                         out_order_id = array_data['out_trade_no']
-                        executor.submit(notify_success,out_order_id)
+                        enqueue(out_order_id)
             except:
                 pass
         elif name == 'mugglepay':
             status = request.form.get('status', None)
             if status and status == 'PAID':
-                res = Mugglepay().verify(request.form.to_dict())
+                res = gateway(Mugglepay).verify(request.form.to_dict())
                 if res:
                     out_order_id = request.form.get('merchant_order_id')
-                    executor.submit(notify_success,out_order_id)
+                    enqueue(out_order_id)
         elif name == 'stripe':
             source = request.args.get('source', None)   #id
             livemode = request.args.get('livemode', None)   #id
             client_secret = request.args.get('client_secret', None)   #id
             if livemode == 'true' and client_secret and livemode and len(client_secret) == 42 and len(source) == 28:
                 # 开始查询
-                executor.submit(stripe_check,source,client_secret)
+                stripe_check(source,client_secret)
         elif name == 'ymq':
             out_order_id = request.form.get('out_order_sn',None)
             if out_order_id and len(out_order_id) == 27:
@@ -232,9 +240,9 @@ def notify(name):
                     payment = 'alipay'
                 else:
                     pass
-                res = Ymq(payment=payment).verify(request.form.to_dict())
+                res = gateway(Ymq, payment=payment).verify(request.form.to_dict())
                 if res:
-                    executor.submit(notify_success,out_order_id)                                     
+                    enqueue(out_order_id)                                     
     except:
         pass
     return 'success'
@@ -244,7 +252,7 @@ def notify(name):
 def stripe_check(source,client_secret):
     res = TempOrder.query.filter_by(contact_txt = source+client_secret).first()
     if res:
-        executor.submit(notify_success,res.out_order_id)  # 为true条件下执行
+        enqueue(res.out_order_id)  # 为true条件下执行
 
 
 
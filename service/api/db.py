@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy as BaseSQLAlchemy
-from sqlalchemy.orm import scoped_session, sessionmaker # 解决高并发
 from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -24,24 +26,82 @@ limiter = Limiter(
     default_limits=["20000 per day", "2000 per hour"]
 )
 
+# 连接池参数，MySQL/PostgreSQL生效；SQLite不使用连接池
+POOL_OPTIONS = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',   # 取连接前探活，避免MySQL断开的连接
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 280)),   # 秒，小于MySQL wait_timeout
+}
+
+# SQLite调优：WAL允许读写并发，busy_timeout等待写锁而不是直接报database is locked
+# 回调线程、定时任务、web进程共用kamifaka.db和middle.db，连接建立时统一设置
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', '1') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # WAL模式下NORMAL即可保证一致性
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 10000)),  # 毫秒
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -32000)),  # 负数单位为KB
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),  # 字节，0为关闭
+}
+
+@event.listens_for(Engine, 'connect')
+def sqlite_pragma(dbapi_connection, connection_record):
+    if not SQLITE_TUNING or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+# pysqlite只在DML前隐式BEGIN，事务外的SAVEPOINT会自己开启事务，RELEASE时即提交，外层回滚不再生效
+# 嵌套auto_commit_db建立保存点前先显式开启事务，保证内层写入随外层一起提交或回滚
+@event.listens_for(Engine, 'savepoint')
+def sqlite_savepoint(conn, name):
+    dbapi_connection = conn.connection.dbapi_connection
+    if isinstance(dbapi_connection, sqlite3.Connection) and not dbapi_connection.in_transaction:
+        dbapi_connection.execute('BEGIN IMMEDIATE')
+
 # 自定义一个SQLAlchemy继承flask_sqlalchemy的,方便自定义方法！！！
 class SQLAlchemy(BaseSQLAlchemy):
 
     # 利用contextmanager管理器,对try/except语句封装，使用的时候必须和with结合！！！
+    # 工作单元：复用flask_sqlalchemy按线程/请求隔离的scoped_session，最外层提交；嵌套调用使用SAVEPOINT
     @contextmanager
     def auto_commit_db(self):
-        # 高并发下的数据库问题
-        self.session = scoped_session(sessionmaker(bind=self.engine))
+        session = self.session()
+        depth = session.info.get('auto_commit_depth', 0)
+        session.info['auto_commit_depth'] = depth + 1
         try:
-            yield
-            self.session.commit()
+            if depth:
+                with session.begin_nested():    # 内层失败只回滚到保存点
+                    yield session
+            else:
+                yield session
+                session.commit()
         except Exception as e:
             # 加入数据库commit提交失败，必须回滚！！！
-            self.session.rollback()
+            if not depth:
+                session.rollback()
             print(e)
             raise e
-        # finally:
-        #     self.session.close()        
+        finally:
+            session.info['auto_commit_depth'] = depth
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        if not sa_url.drivername.startswith('sqlite'):
+            options.update(POOL_OPTIONS)
+        return super().apply_driver_hacks(app, sa_url, options)
+
+    def pool_status(self, bind=None):
+        # 连接池监控：容量、空闲、已借出、溢出连接数
+        pool = self.get_engine(bind=bind).pool
+        info = {'pool': type(pool).__name__}
+        for name in ['size', 'checkedin', 'checkedout', 'overflow']:
+            func = getattr(pool, name, None)
+            if callable(func):
+                info[name] = func()
+        return info
 
 
 #路径设置
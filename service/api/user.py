@@ -1,7 +1,7 @@
 from operator import concat
 from time import time
-from flask import Blueprint, request, jsonify
-from service.database.models import Payment, ProdInfo,Config,Order,Config,ProdCag,TempOrder
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from service.database.models import Payment, ProdInfo,Config,Order,Config,ProdCag,TempOrder,count_stock
 from datetime import datetime,timedelta
 
 from service.util.order.create import make_pay_url,make_tmp_order,alipay_check
@@ -14,6 +14,12 @@ executor = ThreadPoolExecutor(10)
 
 #日志记录
 from service.util.log import log
+from service.util.catalog import catalog,cached_response    #前台目录缓存
+from service.util.order.price import parse_tiers   #批发价格
+from service.util.timeutil import now
+from service.util.order.events import order_events
+from service.util.qr import render, qr_etag, FORMATS, QR_MAX_LEN   #支付二维码
+import os
 from service.api.db import limiter
 
 base = Blueprint('base', __name__,url_prefix='/api/v2')
@@ -23,17 +29,13 @@ base = Blueprint('base', __name__,url_prefix='/api/v2')
 def index():
     return 'base hello'
 
-@base.route('/theme_list', methods=['get'])
-def theme_list():
+def build_theme_list():
     info= {}
     # 系统信息
-    try:
-        prods = ProdInfo.query.filter_by(isactive = True).order_by(ProdInfo.sort).all()
-        cags = ProdCag.query.filter().order_by(ProdCag.sort).all()
-    except Exception as e:
-        log(e)
-        return '数据库异常', 503    
-    prod_list =[x.to_json() for x in prods]
+    prods = ProdInfo.query.filter_by(isactive = True).order_by(ProdInfo.sort).all()
+    cags = ProdCag.query.filter().order_by(ProdCag.sort).all()
+    stock = count_stock([x.name for x in prods])   # 库存一次性分组统计
+    prod_list =[x.to_json(stock) for x in prods]
     cag_list = [x.to_json()['name'] for x in cags]
     tmp_cags = []
     for x in prod_list:
@@ -54,43 +56,37 @@ def theme_list():
     # 主题
     res = Config.query.filter_by(name = 'theme').first()
     info['theme'] = res.to_json()['info']
-    return jsonify(info)
+    return info
+
+@base.route('/theme_list', methods=['get'])
+def theme_list():
+    try:
+        body, etag = catalog.get('theme_list', build_theme_list)
+    except Exception as e:
+        log(e)
+        return '数据库异常', 503    
+    return cached_response(body, etag)
+
+def build_detail(shop_id):
+    prod = ProdInfo.query.filter_by(id = shop_id).first()
+    if not prod:
+        return None
+    res = prod.detail_json()
+    tiers = parse_tiers(res['price_wholesale'])
+    if tiers:
+        res['pifa'] = tiers.to_json()
+    return res
 
 @base.route('/detail/<int:shop_id>', methods=['get'])
 def detail(shop_id):
     try:
-        prod = ProdInfo.query.filter_by(id = shop_id).first_or_404('Product not exist')
+        body, etag = catalog.get('detail:'+str(shop_id), lambda: build_detail(shop_id))
     except Exception as e:
         log(e)
         return '数据库异常', 503   
-    res = prod.detail_json()
-    try:
-        if len(res['price_wholesale']) >5:
-            price = res['price_wholesale'].split('#')[1]
-            num = res['price_wholesale'].split('#')[0]
-            prices = price.split(',')
-            # 处理数量列表
-            nums = []
-            temp = num.split(',')
-            s = len(temp)
-            if s == 1:
-                nums.append('1~'+temp[0])
-                nums.append(str(int(temp[0])+1)+'~')
-            elif s == 2:
-                nums.append('1~'+temp[0])
-                nums.append(str(int(temp[0])+1)+'~'+temp[1])
-                nums.append(str(int(temp[1])+1)+'~')
-            elif s == 3:
-                nums.append('1~'+temp[0])
-                nums.append(str(int(temp[0])+1)+'~'+temp[1])
-                nums.append(str(int(temp[1])+1)+'~'+temp[2])
-                nums.append(str(int(temp[2])+1)+'~')
-            else:
-                pass
-            res['pifa'] = {'nums':nums,'prices':prices,'slice':temp}
-    except:
-        pass
-    return jsonify(res)
+    if body == b'null':
+        return 'Product not exist', 404
+    return cached_response(body, etag)
 
 @base.route('/get_order', methods=['POST']) #联系方式查询
 @limiter.limit("5 per minute", override_defaults=False)
@@ -108,7 +104,7 @@ def get_order():
         return '数据库异常', 503   
     if orders:
         order = orders[-1].check_card() # {}
-        time_count = datetime.utcnow()+timedelta(hours=8)-datetime.strptime(order['updatetime'],'%Y-%m-%d %H:%M') 
+        time_count = now()-datetime.strptime(order['updatetime'],'%Y-%m-%d %H:%M') 
         if time_count.days:
             return 'not found', 200
         else:
@@ -174,6 +170,76 @@ def check_pay_auto():
     return jsonify({'msg':'not paid'})  #支付状态校验     
 
 
+## 等待支付结果：进程内事件唤醒，等待期间不查询数据库；超时后查询一次兜底(多进程部署时由其他进程发卡)
+PAY_WAIT_TIMEOUT = int(os.getenv('PAY_WAIT_TIMEOUT', 25))  # 长轮询最长等待，秒
+PAY_SSE_TIMEOUT = int(os.getenv('PAY_SSE_TIMEOUT', 300))   # SSE连接最长保持，秒
+PAY_SSE_PING = 15   # SSE心跳间隔，秒，防止代理断开空闲连接
+
+def check_paid(out_order_id):
+    return order_events.is_paid(out_order_id) or bool(TempOrder.query.filter_by(out_order_id = out_order_id,status = True).first())
+
+@base.route('/wait_pay', methods=['post']) #长轮询，支付完成立即返回，否则超时返回not paid
+@limiter.limit("10/minute;300/hour;1000/day", override_defaults=False)
+def wait_pay():
+    out_order_id = request.json.get('out_order_id',None)
+    payment = request.json.get('payment',None) #支付方式
+    if not out_order_id or len(out_order_id) !=27:
+        return '参数丢失', 404
+    try:
+        timeout = min(float(request.json.get('timeout',PAY_WAIT_TIMEOUT)),PAY_WAIT_TIMEOUT)
+    except (TypeError, ValueError):
+        timeout = PAY_WAIT_TIMEOUT
+    if payment and payment == '支付宝当面付':
+        executor.submit(alipay_check,out_order_id)  # 主动查询一次
+    if order_events.wait(out_order_id,timeout) or check_paid(out_order_id):
+        return jsonify({'msg':'success'})
+    return jsonify({'msg':'not paid'})
+
+@base.route('/pay_events/<out_order_id>', methods=['get']) #SSE，支付完成推送paid事件
+@limiter.limit("10/minute;300/hour;1000/day", override_defaults=False)
+def pay_events(out_order_id):
+    payment = request.args.get('payment',None)
+    if len(out_order_id) !=27:
+        return '参数丢失', 404
+    def stream():
+        yield 'retry: 3000\n\n'
+        deadline = time() + PAY_SSE_TIMEOUT
+        while deadline > time():
+            if payment == '支付宝当面付':
+                executor.submit(alipay_check,out_order_id)  # 每个心跳周期主动查询一次
+            if order_events.wait(out_order_id,min(PAY_SSE_PING,deadline - time())):
+                yield 'event: paid\ndata: {"msg": "success"}\n\n'
+                return
+            yield ': ping\n\n'
+        if check_paid(out_order_id):
+            yield 'event: paid\ndata: {"msg": "success"}\n\n'
+        else:
+            yield 'event: timeout\ndata: {"msg": "not paid"}\n\n'
+    resp = Response(stream_with_context(stream()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'   # 关闭nginx缓冲
+    return resp
+
+@base.route('/qr', methods=['get']) #支付二维码，text为支付链接，format可选png/svg
+@limiter.limit("60/minute;2000/day", override_defaults=False)
+def qr():
+    text = request.args.get('text',None)
+    fmt = request.args.get('format','png')
+    if not text or len(text) > QR_MAX_LEN or fmt not in FORMATS:
+        return '参数错误', 400
+    etag = qr_etag(text,fmt)
+    if request.if_none_match.contains(etag):    # 命中协商缓存，无需渲染
+        resp = Response(status=304)
+    else:
+        try:
+            resp = Response(render(text,fmt), mimetype=FORMATS[fmt])
+        except Exception as e:
+            log(e)
+            return '二维码生成失败', 500
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'public, max-age=86400'
+    return resp
+
 @base.route('/get_card', methods=['post']) #已售订单信息--自动查询
 def get_card():
     out_order_id = request.json.get('out_order_id',None)
@@ -191,16 +257,19 @@ def get_card():
     return '订单丢失', 404
     
 
+def build_system():
+    res = Config.query.filter().all()
+    info = {}
+    for i in [x.to_json2() for x in res]:
+        info[i['name']] = i
+    pays =  Payment.query.filter_by(isactive = True).all()
+    info['pays'] = [x.enable_json() for x in pays]  # ({'pays':['支付宝当面付','码支付微信','PAYJS支付宝'],'icons':['支付宝当面付','码支付微信','PAYJS支付宝']})
+    return info
+
 @base.route('/get_system', methods=['get'])
 def get_system():
     try:
-        res = Config.query.filter().all()
-        info = {}
-        for i in [x.to_json2() for x in res]:
-            info[i['name']] = i
-        pays =  Payment.query.filter_by(isactive = True).all()
-        info['pays'] = [x.enable_json() for x in pays]  # ({'pays':['支付宝当面付','码支付微信','PAYJS支付宝'],'icons':['支付宝当面付','码支付微信','PAYJS支付宝']})
-        return jsonify(info)
+        body, etag = catalog.get('get_system', build_system)
     except:
         return '数据库异常', 503
-    
\ No newline at end of file
+    return cached_response(body, etag)
@@ -1,9 +1,18 @@
+import os
+import json
+import zlib
 from sqlalchemy.sql import elements
 from sqlalchemy.sql.sqltypes import Float
 from service.api.db import db
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, Date, LargeBinary
+from sqlalchemy import func, case, Index
+from service.util.json_config import load_config
+from service.util.order.price import unit_price
+from service.util.timeutil import now
 # from service.database.count import count_card
+# 库存读取product_stock计数表；设为0则每次按卡密表实时统计
+STOCK_COUNTER = os.getenv('STOCK_COUNTER', '1') == '1'
 # 管理员
 
 
@@ -13,7 +22,7 @@ class AdminUser(db.Model):
     email = Column(String(50), nullable=False)
     hash = Column(String(70), nullable=False)  # 存储密码,pssql存储过长是由于byte字节导致的
     updatetime = Column(DateTime, nullable=True,
-                        default=datetime.utcnow()+timedelta(hours=8))  # 存储变更时间
+                        default=now)  # 存储变更时间
 
     def __init__(self, email, hash):
         self.email = email
@@ -30,7 +39,7 @@ class AdminLog(db.Model):
     id = Column(Integer, primary_key=True, autoincrement=True)
     ip = Column(String(100), nullable=False)
     updatetime = Column(DateTime, nullable=True,
-                        default=datetime.utcnow()+timedelta(hours=8))  # 存储变更时间
+                        default=now)  # 存储变更时间
 
     def __init__(self, ip):
         self.ip = ip
@@ -65,7 +74,7 @@ class Payment(db.Model):
             'id': self.id,
             'name': self.name,
             'icon': self.icon,
-            'config': eval(self.config),
+            'config': load_config(self.config),
             'info': self.info,
             'isactive': self.isactive,
         }
@@ -130,7 +139,7 @@ class ProdInfo(db.Model):
         self.tag = tag
         self.isactive = isactive
 
-    def to_json(self):  # 用于首页列表展示
+    def to_json(self, stock=None):  # 用于首页列表展示；stock为count_stock()的批量结果
         return {
             'cag_name': self.cag_name,
             'name': self.name,
@@ -140,11 +149,17 @@ class ProdInfo(db.Model):
             'auto': self.auto,
             'tag': self.tag,
             'sales': self.sales,
-            'stock': self.__count_card__(self.name),  # 库存信息，此处函数处理
+            'stock': self.__count_card__(self.name, stock),  # 库存信息，此处函数处理
         }
 
-    def __count_card__(self, prod_name):
-        count = Card.query.filter_by(prod_name=prod_name, isused=False).count()
+    def __get_stock__(self, prod_name, stock):
+        # 批量统计结果中取值，未传入时单独统计一次
+        if stock is None:
+            stock = count_stock([prod_name])
+        return stock.get(prod_name, (0, False))
+
+    def __count_card__(self, prod_name, stock=None):
+        count, reuse = self.__get_stock__(prod_name, stock)
         if count > 10:
             return '充足'
         elif count == 0:
@@ -153,18 +168,18 @@ class ProdInfo(db.Model):
             else:
                 return '充足'
         elif count == 1:
-            # 再次统计
-            if Card.query.filter_by(prod_name=prod_name, reuse=True).first():
+            # 重复卡密
+            if reuse:
                 return '充足'
             return '少量'
         else:
             return '少量'
 
-    def __count_card_detail__(self, prod_name):
-        count = Card.query.filter_by(prod_name=prod_name, isused=False).count()
+    def __count_card_detail__(self, prod_name, stock=None):
+        count, reuse = self.__get_stock__(prod_name, stock)
         if count == 1:
-            # 再次统计
-            if Card.query.filter_by(prod_name=prod_name, reuse=True).first():
+            # 重复卡密
+            if reuse:
                 return '∞'
             return count
         elif count == 0:
@@ -175,7 +190,7 @@ class ProdInfo(db.Model):
         else:
             return count
 
-    def admin_json(self):
+    def admin_json(self, stock=None):
         return {
             'cag_name': self.cag_name,
             'name': self.name,
@@ -184,7 +199,7 @@ class ProdInfo(db.Model):
             'price_wholesale': self.price_wholesale,
             'auto': self.auto,
             'tag': self.tag,
-            'stock': self.__count_card_detail__(self.name),
+            'stock': self.__count_card_detail__(self.name, stock),
             'sales': self.sales,
             'isactive': self.isactive,
         }
@@ -206,7 +221,7 @@ class ProdInfo(db.Model):
             'isactive': self.isactive,
         }
 
-    def detail_json(self):
+    def detail_json(self, stock=None):
         return {
             'name': self.name,
             'prod_id': self.id,
@@ -216,7 +231,7 @@ class ProdInfo(db.Model):
             'auto': self.auto,
             'tag': self.tag,
             'discription': self.discription,
-            'stock': self.__count_card_detail__(self.name),
+            'stock': self.__count_card_detail__(self.name, stock),
             'isactive': self.isactive,
 
         }
@@ -235,6 +250,11 @@ class Order(db.Model):
     __mapper_args__ = {
         'confirm_deleted_rows': False
     }
+    __table_args__ = (
+        Index('ix_order_out_order_id', 'out_order_id'),  # 回调去重、查卡密
+        Index('ix_order_contact', 'contact'),  # 联系方式查询
+        Index('ix_order_updatetime', 'updatetime'),  # 统计时间窗口
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     out_order_id = Column(String(50), nullable=False)  # 订单ID
     name = Column(String(50), nullable=False)  # 商品名
@@ -265,7 +285,7 @@ class Order(db.Model):
         if updatetime:
             self.updatetime = updatetime
         else:
-            self.updatetime = datetime.utcnow()+timedelta(hours=8)
+            self.updatetime = now()
 
     def __check_card(self, card):
         if card:
@@ -335,6 +355,11 @@ class TempOrder(db.Model):
     __mapper_args__ = {
         'confirm_deleted_rows': False
     }
+    __table_args__ = (
+        Index('ix_temporder_out_order_id_status', 'out_order_id', 'status'),  # 支付状态轮询
+        Index('ix_temporder_contact_txt', 'contact_txt', mysql_length=100),  # stripe回调校验，MySQL的TEXT需前缀长度
+        Index('ix_temporder_updatetime', 'updatetime'),  # 过期临时订单清理
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     out_order_id = Column(String(50), nullable=False)  # 订单ID
     name = Column(String(50), nullable=False)  # 商品名
@@ -347,13 +372,14 @@ class TempOrder(db.Model):
     status = Column(Boolean, nullable=True, default=True)  # 订单状态---False
     auto = Column(Boolean, nullable=False, default=False)  # 手工或自动发货
     updatetime = Column(DateTime, nullable=False,
-                        default=datetime.utcnow()+timedelta(hours=8))  # 创建时间
+                        default=now)  # 创建时间
     endtime = Column(DateTime, nullable=True)  # 最后时间
 
-    def __init__(self, out_order_id, name, payment, contact, contact_txt, num, status, endtime):
+    def __init__(self, out_order_id, name, payment, contact, contact_txt, num, status, endtime, shop=None):
         self.out_order_id = out_order_id
         self.name = name
-        self.shop = ProdInfo.query.filter_by(name=self.name).first()
+        # 商品由调用方查好传入，价格与发货方式都取自这一次查询，不统计库存
+        self.shop = shop or ProdInfo.query.filter_by(name=self.name).first()
         self.payment = payment
         self.contact = contact
         self.contact_txt = contact_txt
@@ -361,44 +387,13 @@ class TempOrder(db.Model):
         self.price = float(self.__cal_price__())
         self.total_price = round(self.num * self.price, 2)
         self.status = status
-        self.auto = self.shop.detail_json()['auto']
-        self.updatetime = datetime.utcnow()+timedelta(hours=8)
+        self.auto = self.shop.auto
+        self.updatetime = now()
         self.endtime = endtime
         # print(f'价格{self.price} 总价格{self.total_price}')
 
     def __cal_price__(self):
-        # shop = ProdInfo.query.filter_by(name = self.name).first()
-        shop = self.shop
-        if shop:
-            res = shop.detail_json()
-            if not res['isactive']:
-                return 0
-            if res['price_wholesale']:
-                if len(res['price_wholesale']) > 4:
-                    len_pifa = len(
-                        res['price_wholesale'].split('#')[0].split(','))
-                    if len_pifa == 1:  # 两层
-                        if self.num > int(res['price_wholesale'].split('#')[0]):
-                            return res['price_wholesale'].split('#')[1].split(',')[1]
-                        return res['price_wholesale'].split('#')[1].split(',')[0]
-                    elif len_pifa == 2:  # 三层
-                        if self.num <= int(res['price_wholesale'].split('#')[0].split(',')[0]):
-                            return res['price_wholesale'].split('#')[1].split(',')[0]
-                        elif self.num > int(res['price_wholesale'].split('#')[0].split(',')[1]):
-                            return res['price_wholesale'].split('#')[1].split(',')[2]
-                        return res['price_wholesale'].split('#')[1].split(',')[1]
-                    elif len_pifa == 3:  # 四次
-                        if self.num <= int(res['price_wholesale'].split('#')[0][0]):
-                            return res['price_wholesale'].split('#')[1].split(',')[0]
-                        elif self.num > int(res['price_wholesale'].split('#')[0][0]) and self.num <= int(res['price_wholesale'].split('#')[0][1]):
-                            return res['price_wholesale'].split('#')[1].split(',')[1]
-                        elif self.num > int(res['price_wholesale'].split('#')[0][1]) and self.num <= int(res['price_wholesale'].split('#')[0][2]):
-                            return res['price_wholesale'].split('#')[1].split(',')[2]
-                        return res['price_wholesale'].split('#')[1].split(',')[3]
-                    else:
-                        return 9999
-            return res['price']
-        return 9999
+        return unit_price(self.shop, self.num)
 
     def to_json(self):
         return {
@@ -429,6 +424,37 @@ class TempOrder(db.Model):
         }
 
 
+class TempOrderArchive(db.Model):
+    __tablename__ = 'temporder_archive'  # 已支付临时订单归档，每批清理压缩为一行
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    count = Column(Integer, nullable=False)  # 本批订单数
+    start_time = Column(DateTime, nullable=False)  # 本批最早创建时间
+    end_time = Column(DateTime, nullable=False)  # 本批最晚创建时间
+    data = Column(LargeBinary(length=2**24), nullable=False)  # zlib压缩的JSON行，MySQL下为MEDIUMBLOB
+    updatetime = Column(DateTime, nullable=False, default=now)  # 归档时间
+
+    def __init__(self, orders):
+        times = [x.updatetime for x in orders]
+        self.count = len(orders)
+        self.start_time = min(times)
+        self.end_time = max(times)
+        self.data = zlib.compress('\n'.join(json.dumps(x.to_json2(), ensure_ascii=False) for x in orders).encode('utf-8'))
+        self.updatetime = now()
+
+    def records(self):
+        return [json.loads(x) for x in zlib.decompress(self.data).decode('utf-8').split('\n')]
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'count': self.count,
+            'start_time': self.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'end_time': self.end_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'size': len(self.data),
+            'updatetime': self.updatetime.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
 class Order2(db.Model):
     __bind_key__ = 'order'  # 使用order数据库
     __tablename__ = 'order2'  # 订单信息
@@ -483,6 +509,9 @@ class Card(db.Model):
     __mapper_args__ = {
         'confirm_deleted_rows': False
     }
+    __table_args__ = (
+        Index('ix_card_prod_name_isused', 'prod_name', 'isused'),  # 库存统计、发卡
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     prod_name = Column(String(50), nullable=False)  # 商品ID
     card = Column(Text, nullable=False)  # 卡密
@@ -505,6 +534,89 @@ class Card(db.Model):
         }
 
 
+class NotifyTask(db.Model):
+    __tablename__ = 'notify_task'  # 支付回调发卡队列，持久化保证进程重启不丢单
+    __table_args__ = (
+        Index('ix_notify_task_status_run_at', 'status', 'run_at'),  # 领取待执行任务
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    out_order_id = Column(String(50), nullable=False, unique=True)  # 订单ID，唯一约束实现重复回调去重
+    status = Column(String(20), nullable=False, default='pending')  # pending待执行；running执行中；done完成；dead重试耗尽
+    attempts = Column(Integer, nullable=False, default=0)  # 已执行次数
+    run_at = Column(DateTime, nullable=False)  # 下次执行时间；running状态下为租约到期时间
+    last_error = Column(Text, nullable=True)  # 最近一次失败原因
+    updatetime = Column(DateTime, nullable=False)  # 创建或变更时间
+
+    def __init__(self, out_order_id):
+        self.out_order_id = out_order_id
+        self.status = 'pending'
+        self.attempts = 0
+        self.updatetime = self.run_at = now()
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'out_order_id': self.out_order_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'run_at': self.run_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'last_error': self.last_error,
+            'updatetime': self.updatetime.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+class DailyStats(db.Model):
+    __tablename__ = 'daily_stats'  # 按天汇总的订单统计，下单时增量更新，年度及全部图表直接读取
+    day = Column(Date, primary_key=True)  # 日期
+    orders = Column(Integer, nullable=False, default=0)  # 订单数
+    num = Column(Integer, nullable=False, default=0)  # 销售数量
+    income = Column(Float, nullable=False, default=0)  # 收入
+
+    def __init__(self, day, orders, num, income):
+        self.day = day
+        self.orders = orders
+        self.num = num
+        self.income = income
+
+
+class ProductStock(db.Model):
+    __tablename__ = 'product_stock'  # 商品库存计数，卡密增删、领取时同事务更新，定时任务与卡密表对账
+    prod_name = Column(String(50), primary_key=True)  # 商品名
+    unused = Column(Integer, nullable=False, default=0)  # 未使用卡密数
+    reuse = Column(Boolean, nullable=False, default=False)  # 是否存在重复卡密
+    restock_time = Column(DateTime, nullable=True)  # 最近补货时间
+    updatetime = Column(DateTime, nullable=False)  # 变更时间
+
+    def __init__(self, prod_name, unused, reuse, restock_time=None):
+        self.prod_name = prod_name
+        self.unused = unused
+        self.reuse = reuse
+        self.restock_time = restock_time
+        self.updatetime = now()
+
+
+def count_card_stock(prod_names=None):
+    """按卡密表实时统计：一次GROUP BY查询，返回{商品名: (未使用卡密数, 是否存在重复卡密)}"""
+    query = db.session.query(
+        Card.prod_name,
+        func.sum(case([(Card.isused == False, 1)], else_=0)),
+        func.max(case([(Card.reuse == True, 1)], else_=0)),
+    )
+    if prod_names is not None:
+        query = query.filter(Card.prod_name.in_(prod_names))
+    return {name: (int(count or 0), bool(reuse)) for name, count, reuse in query.group_by(Card.prod_name)}
+
+
+def count_stock(prod_names=None):
+    """库存查询：读取计数表，按主键取值；返回{商品名: (未使用卡密数, 是否存在重复卡密)}"""
+    if not STOCK_COUNTER:
+        return count_card_stock(prod_names)
+    query = db.session.query(ProductStock.prod_name, ProductStock.unused, ProductStock.reuse)
+    if prod_names is not None:
+        query = query.filter(ProductStock.prod_name.in_(prod_names))
+    return {name: (unused, bool(reuse)) for name, unused, reuse in query}
+
+
 class Config(db.Model):
     __tablename__ = 'config'  # 系统配置
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -513,7 +625,7 @@ class Config(db.Model):
     description = Column(Text, nullable=False)  # 描述
     isshow = Column(Boolean, nullable=False, default=False)  # 描述
     updatetime = Column(DateTime, nullable=True,
-                        default=datetime.utcnow()+timedelta(hours=8))  # 交易时间
+                        default=now)  # 交易时间
 
     def __init__(self, name, info, description, isshow):
         self.name = name
@@ -555,7 +667,7 @@ class Plugin(db.Model):
     def to_json(self):
         return {
             'name': self.name,
-            'config': eval(self.config),
+            'config': load_config(self.config),
             'about': self.about,
             'switch': self.switch,
         }
@@ -582,7 +694,7 @@ class Notice(db.Model):
         return {
             'id': self.id,
             'name': self.name,
-            'config': eval(self.config),
+            'config': load_config(self.config),
             'admin_account': self.admin_account,
             'admin_switch': self.admin_switch,
             'user_switch': self.user_switch
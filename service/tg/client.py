@@ -0,0 +1,21 @@
+import os
+import threading
+import telegram
+from telegram.utils.request import Request
+
+# 共享Bot客户端：按token缓存，发送二维码/卡密时不再每次新建Bot和HTTP连接池
+# 连接池需覆盖全部run_async工作线程，否则并发发送时排队等待连接
+TG_WORKERS = int(os.getenv('TG_WORKERS', 8))  # 处理器线程数，数据库查询与网关请求在此线程池内执行
+
+_lock = threading.Lock()
+_bots = {}  # token ==> telegram.Bot
+
+
+def get_bot(token):
+    bot = _bots.get(token)
+    if bot:
+        return bot
+    with _lock:
+        if token not in _bots:
+            _bots[token] = telegram.Bot(token=token, request=Request(con_pool_size=TG_WORKERS + 4))
+        return _bots[token]
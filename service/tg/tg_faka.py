@@ -1,14 +1,17 @@
 from logging import warning
 import time
-import io
 import random
 import string
-import qrcode
-import telegram
 from telegram import InlineKeyboardButton,InlineKeyboardMarkup
 from telegram.ext import ConversationHandler,CommandHandler,CallbackQueryHandler,MessageHandler,Filters,Updater
-from service.database.models import Order,Plugin,ProdInfo,Payment,Card,Notice
+from service.database.models import Order,Plugin,ProdInfo,Payment,Card,Notice,count_stock
 from service.api.db import db
+from service.util.order.reserve import claim_cards
+from service.util.stats import record_order
+from service.util.catalog import catalog
+
+#日志记录
+from service.util.log import log
 
 #调用支付接口
 from service.util.pay.alipay.alipayf2f import AlipayF2F    #支付宝接口
@@ -18,6 +21,10 @@ from service.util.pay.payjs.payjs import Payjs  #payjs接口
 from service.util.pay.wechat.weixin import Wechat   # 微信官方
 from service.util.pay.epay.common import Epay   # 易支付
 from service.util.pay.mugglepay.mugglepay import Mugglepay
+from service.util.pay.registry import gateway   # 网关对象缓存
+from service.tg.watcher import pay_watcher  # 待支付订单监视
+from service.tg.client import get_bot, TG_WORKERS   # 共享Bot客户端
+from service.util.qr import qr_file    # 支付二维码缓存
 
 from service.util.message.smtp import mail_to_admin
 from service.util.message.sms import sms_to_admin
@@ -31,9 +38,10 @@ executor = ThreadPoolExecutor(2)
 def get_config():
     result = Plugin.query.filter_by(name = 'TG发卡').first()
     if result:
-        switch = result.to_json()['switch']
-        about = result.to_json()['about']
-        TOKEN = result.to_json()['config']['TG_TOKEN']
+        info = result.to_json()
+        switch = info['switch']
+        about = info['about']
+        TOKEN = info['config']['TG_TOKEN']
         if switch:
             if len(TOKEN) == 46:
                 return TOKEN,about,switch
@@ -41,21 +49,6 @@ def get_config():
 
 ROUTE, PAYMENT,SUBMIT ,CHECK_PAY, PRICE, TRADE,  = range(6)
 
-def make_qr_code(text):
-    qr = qrcode.QRCode(
-        version=3,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=2,
-    )
-    qr.add_data(text)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    # 字节转换
-    qr_bytes = io.BytesIO()
-    img.save(qr_bytes, format='PNG')
-    return io.BytesIO(qr_bytes.getvalue())  #输入二进制
-
 def start(update, context):
     if update.effective_user.username:
         keyboard = [
@@ -79,7 +72,8 @@ def buy(update, context):
     # shop_list = ['商品A','商品B','商品C',]  # 现货商品；包含名称、价格、库存、发货模式
     # shop_lists = [{'name':'商品A','price':9.9,'kucun':'充足','auto':'自动'},{'name':'商品B','price':9.9,'kucun':'充足','auto':'自动'},{'name':'商品C','price':9.9,'kucun':'充足','auto':'自动'}]  # 现货商品；包含名称、价格、库存、发货模式
     prods = ProdInfo.query.filter_by(isactive = True).all()
-    prod_list =[x.admin_json() for x in prods] # 分类、名称、价格、是否自动发货，stock库存
+    stock = count_stock([x.name for x in prods])
+    prod_list =[x.admin_json(stock) for x in prods] # 分类、名称、价格、是否自动发货，stock库存
 
     keyboard = []
     for i in prod_list:
@@ -154,10 +148,9 @@ def pay(update, context):
         else:
             qr_code_url = result
         query.edit_message_text(text='请在1分30s内完成支付，超时自动取消')
-        bot = telegram.Bot(token=get_config()[0])
-        bot.send_photo(chat_id=update.effective_user.id,photo=make_qr_code(qr_code_url))
-        # 开启订单查询
-        executor.submit(check_order,context.user_data)
+        context.bot.send_photo(chat_id=update.effective_user.id,photo=qr_file(qr_code_url))
+        # 加入支付监视，支付成功后发卡
+        pay_watcher.watch(dict(context.user_data))
         return CHECK_PAY
     else:
         query.edit_message_text(text="获取支付二维码失败 主菜单: /start \n")
@@ -171,9 +164,9 @@ def get_pay_url(data):  # name,total_price,payment
     name = name.replace('=','_')  #防止k，v冲突        
     if payment == '支付宝当面付':
         try:
-            ali_order = AlipayF2F().create_order(name,out_order_id,total_price)
+            ali_order = gateway(AlipayF2F).create_order(name,out_order_id,total_price)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if ali_order['code'] == '10000' and ali_order['msg'] == 'Success':
             return   ali_order['qr_code'] #默认自带qrcode
@@ -181,7 +174,7 @@ def get_pay_url(data):  # name,total_price,payment
         # return jsonify({'qr_code':'455555555454deffffffff'})
     elif payment == '虎皮椒微信':
         try:
-            obj = Hupi()
+            obj = gateway(Hupi)
             pay_order = obj.Pay(trade_order_id=out_order_id,total_fee=total_price,title=name)
             if pay_order.json()['errmsg'] == 'success!':
                 """
@@ -195,16 +188,16 @@ def get_pay_url(data):  # name,total_price,payment
                 return pay_order.json()['url']
             return None             
         except Exception as e:
-            print(e)
+            log(e)
             return None               
         # print(ali_order)
     elif payment == '虎皮椒支付宝':
         
         try:
-            obj = Hupi(payment='alipay')
+            obj = gateway(Hupi, payment='alipay')
             pay_order = obj.Pay(trade_order_id=out_order_id,total_fee=total_price,title=name)
         except Exception as e:
-            print(e)
+            log(e)
             return None                       
         # 参数错误情况下，会失效
         if pay_order.json()['errmsg'] == 'success!':
@@ -213,45 +206,45 @@ def get_pay_url(data):  # name,total_price,payment
     elif payment in ['码支付微信','码支付支付宝','码支付QQ']:
         # 参数错误情况下，会失效
         try:
-            qr_url = CodePay().create_order(payment,total_price,out_order_id)
+            qr_url = gateway(CodePay).create_order(payment,total_price,out_order_id)
             # print(qr_url)
         except Exception as e:
-            print(e)
+            log(e)
             return None                      
         return qr_url
     elif payment in ['PAYJS支付宝','PAYJS微信']:
         # 参数错误情况下，会失效
         try:
-            r = Payjs().create_order(name,out_order_id,total_price)
+            r = gateway(Payjs).create_order(name,out_order_id,total_price)
         except Exception as e:
-            print(e)
+            log(e)
             return None  
         if r and r.json()['return_msg'] == 'SUCCESS':
             return r.json()['code_url'],r.json()['payjs_order_id']
         return None                    
     elif payment in ['微信官方接口']:
         try:
-            r = Wechat().create_order(name,out_order_id,total_price)
+            r = gateway(Wechat).create_order(name,out_order_id,total_price)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if r:
             return r   
         return None 
     elif payment in ['易支付']:
         try:
-            r = Epay().create_order(name,out_order_id,total_price)
+            r = gateway(Epay).create_order(name,out_order_id,total_price)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if r:
             return r   
         return None           
     elif payment in ['Mugglepay']:
         try:
-            r = Mugglepay().create_order(name,out_order_id,total_price)
+            r = gateway(Mugglepay).create_order(name,out_order_id,total_price)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if r:
             return r   
@@ -264,19 +257,12 @@ def check_pay(data):
     # 查询接口
     out_order_id = data['out_order_id']
     payment = data['payment']
-    #其余订单信息
-    name = data['name']
-    contact = data['contact']
-    contact_txt = data['contact_txt']
-    total_price = data['price']
-    price = data['price']
-    num = 1
-    # 支付渠道校验
+    # 支付渠道校验，只返回是否已支付，发卡由pay_watcher调用make_order
     if payment == '支付宝当面付':
         try:
-            res = AlipayF2F().check(out_order_id)
+            res = gateway(AlipayF2F).check(out_order_id)
         except Exception as e:
-            print(e)
+            log(e)
             return None              
         # res = True  #临时测试
         # print(result)
@@ -284,44 +270,38 @@ def check_pay(data):
             # start = time()
             # print('支付成功1')  #默认1.38s后台执行时间；重复订单执行时间0.01秒；异步后，时间为0.001秒
             # make_order(out_order_id,name,payment,contact,contact_txt,price,num,total_price)
-            executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price=total_price,num=1,total_price=total_price)
-            # print('提交结果1')
-            # print(time()-start) 
             return True
         return None    
     elif payment in ['虎皮椒支付宝','虎皮椒微信']:
         try:
-            obj = Hupi()
+            obj = gateway(Hupi)
             result = obj.Check(out_trade_order=out_order_id)
         except Exception as e:
-            print(e)            
+            log(e)            
             return None
         #失败订单
         try:
             if result.json()['data']['status'] == "OD":  #OD(支付成功)，WP(待支付),CD(已取消)
-                executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price,num,total_price)
                 return True             
         except :
             return None
         return None    
       
     elif payment in ['码支付微信','码支付支付宝','码支付QQ']:
-        result = CodePay().check(out_order_id)
+        result = gateway(CodePay).check(out_order_id)
         #失败订单
         try:
             if result['msg'] == "success":  #OD(支付成功)，WP(待支付),CD(已取消)
-                executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price,num,total_price)
                 return True              
         except :
             return None
         return None        
     elif payment in ['PAYJS支付宝','PAYJS微信']:
         payjs_order_id = data['payjs_order_id']
-        result = Payjs().check(payjs_order_id)
+        result = gateway(Payjs).check(payjs_order_id)
         #失败订单
         try:
             if result:
-                executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price,num,total_price)
                 return True             
         except :
             return None
@@ -329,32 +309,29 @@ def check_pay(data):
         return None     
     elif payment in ['微信官方接口']:
         try:
-            r = Wechat().check(out_order_id)
+            r = gateway(Wechat).check(out_order_id)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if r:
-            executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price,num,total_price)
             return True    
         return None
     elif payment in ['易支付']:
         try:
-            r = Epay().check(out_order_id)
+            r = gateway(Epay).check(out_order_id)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if r:
-            executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price,num,total_price)
             return True   
         return None        
     elif payment in ['Mugglepay']:
         try:
-            r = Mugglepay().check(out_order_id)
+            r = gateway(Mugglepay).check(out_order_id)
         except Exception as e:
-            print(e)
+            log(e)
             return None
         if r:
-            executor.submit(make_order,out_order_id,name,payment,contact,contact_txt,price,num,total_price)
             return True  
         return None            
 
@@ -376,32 +353,24 @@ def make_order(data):   # 主要为订单创建，异步一个管理员通知
     total_price = price
     if not (Order.query.filter_by(out_order_id = out_order_id).first()):
         status = True   #订单状态
-        # 生成订单 --除了上述内容外，还需要卡密。
-        
-        result = Card.query.filter_by(prod_name = name,isused = False).first()  #此处可用用0，也可以用false
-        if result:
-            card = result.to_json()['card']
-            reuse = result.to_json()['reuse']   #返回True或False
-            if not reuse: #卡密状态修改
-                with db.auto_commit_db():
-                    Card.query.filter_by(id = result.to_json()['id']).update({'isused':True})
-        else:
-            card = None
-            status = False
-            # print('卡密为空')
-            print(f'{contact}购买的{name}缺货，卡密信息为空')
-            return None
-
-
-        #订单创建
+        #订单创建--领取卡密与写入订单同一事务，写入失败时领取一并回滚
         try:
-            # print(f'卡密信息{card}')
-            new_order= Order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,card,None,None)
             with db.auto_commit_db():
+                # 生成订单 --除了上述内容外，还需要卡密。
+                cards, reuse = claim_cards(name, 1)    #原子领取，重复卡密不标记已用
+                if not cards:
+                    # print('卡密为空')
+                    log(f'{contact}购买的{name}缺货，卡密信息为空')
+                    return None
+                card = cards[0]
+                # print(f'卡密信息{card}')
+                new_order= Order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,card,None,None)
                 db.session.add(new_order)
+                record_order(new_order.updatetime,num,float(total_price))  # 按天汇总，与订单同一事务
+            catalog.invalidate()    # 库存变化，前台目录缓存失效
             # log('订单创建完毕')
         except Exception as e:
-            print(e)
+            log(e)
             # return '订单创建失败', 500    
             return None     
 
@@ -417,12 +386,13 @@ def make_order(data):   # 主要为订单创建，异步一个管理员通知
         data['total_price'] = total_price
         data['card'] = card
         data['status'] = status
+        data['updatetime'] = new_order.updatetime.strftime('%Y-%m-%d %H:%M:%S')
         # 执行队列任务
         # print('后台正在执行队列')
         try:
             task(data)  #为避免奔溃，特别设置
         except Exception as e:
-            print(e)  #代表通知序列任务失败                                
+            log(e)  #代表通知序列任务失败                                
         
 
 
@@ -436,7 +406,7 @@ def task(data):
     try:
         notices = [x.to_json() for x in Notice.query.filter().all()]
     except Exception as e:
-        print(e)
+        log(e)
         return '订单创建失败', 500       
     # 管理员和用户开关判断
     for i in notices:      #如果是邮箱，外加一个；或者conig内容直接为邮箱内容，传递邮箱参数
@@ -453,7 +423,7 @@ def task(data):
     # ## 再次检测管理员开关【接收开关】，用户个性化判断：手机--发短信；邮箱--发邮件
 
 def send_tg_msg(chat_id,message):
-    bot = telegram.Bot(token=get_config()[0])
+    bot = get_bot(get_config()[0])
     bot.send_message(chat_id=chat_id,text=message)    
     # === 执行具体的函数：比如邮箱或短信通知
 #---管理员
@@ -465,43 +435,32 @@ def send_admin(notice_name,config,admin_account,data):  #通知途径+管理员
             mail_to_admin(config,admin_account,data)
         except Exception as e:
             # log('邮箱通知失败 ')  #          
-            print(e)  #通知失败           
+            log(e)  #通知失败           
     elif notice_name == '短信通知':
         try:
             sms_to_admin(config,admin_account,data)
         except Exception as e:
             # log('短信通知失败 ')  #          
-            print(e)  #通知失败              
+            log(e)  #通知失败              
     elif notice_name == '微信通知':
         try:
             # print('微信通知')
             wxpush(config,admin_account,data)     
         except Exception as e:
             # log('微信通知失败 ')  #          
-            print(e)  #通知失败             
+            log(e)  #通知失败             
         
     elif notice_name == 'TG通知':
         try:
             post_tg(config,admin_account,data)    
         except Exception as e:
             # log('TG通知失败 ')  #          
-            print(e)  #通知失败             
+            log(e)  #通知失败             
     else:
         print('接口参数错误')
         # log('接口参数错误')  #通知失败 
 
 
-def check_order(data):
-    # 订单查询- 给出卡密信息
-    # 上一步获得商品名称+支付渠道；用户id+昵称；商品里还有价格等属性
-    # 先判断数据库是否存在订单，不存在则检查，存在则给出结果
-    # 支付状态检查： 循环
-    for i in range(88):
-        time.sleep(4)
-        # 支付后的效果
-        if check_pay(data):
-            break 
-
 def search_order(update, context):  #done
     query = update.callback_query
     query.answer()        
@@ -541,31 +500,31 @@ def timeout(update, context):
     return ConversationHandler.END
 
 start_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start)],
+        entry_points=[CommandHandler('start', start, run_async=True)],
 
         states={
             ROUTE: [
-                CommandHandler('start', start),
-                CallbackQueryHandler(buy, pattern='^' + str('购买商品') + '$'),
-                CallbackQueryHandler(search_order, pattern='^' + str('查询订单') + '$'),
-                CallbackQueryHandler(about, pattern='^' + str('联系我们') + '$'),
+                CommandHandler('start', start, run_async=True),
+                CallbackQueryHandler(buy, pattern='^' + str('购买商品') + '$', run_async=True),
+                CallbackQueryHandler(search_order, pattern='^' + str('查询订单') + '$', run_async=True),
+                CallbackQueryHandler(about, pattern='^' + str('联系我们') + '$', run_async=True),
             ],
             PAYMENT: [
-                CommandHandler('start', start),
-                CallbackQueryHandler(payment, pattern='.*?'),
+                CommandHandler('start', start, run_async=True),
+                CallbackQueryHandler(payment, pattern='.*?', run_async=True),
             ],  
             SUBMIT: [
-                CommandHandler('start', start),
-                CallbackQueryHandler(pay, pattern='.*?'),
+                CommandHandler('start', start, run_async=True),
+                CallbackQueryHandler(pay, pattern='.*?', run_async=True),
                 CallbackQueryHandler(cancel, pattern='^' + str('取消订单') + '$')
             ],    
             CHECK_PAY: [
-                CommandHandler('start', start),
-                CallbackQueryHandler(payment, pattern='.*?'),
+                CommandHandler('start', start, run_async=True),
+                CallbackQueryHandler(payment, pattern='.*?', run_async=True),
             ],                                
-            ConversationHandler.TIMEOUT: [MessageHandler(Filters.all, timeout)],
+            ConversationHandler.TIMEOUT: [MessageHandler(Filters.all, timeout, run_async=True)],
         },
-        fallbacks=[CommandHandler('cancel', cancel)],
+        fallbacks=[CommandHandler('cancel', cancel, run_async=True)],
         # per_message=True,
     )
 
@@ -574,9 +533,11 @@ def run_bot():
     config = get_config()
     # print(config)
     if config:
-        updater = Updater(token=config[0], use_context=True)
+        # 处理器run_async，数据库查询与网关请求在TG_WORKERS个线程内并发执行
+        updater = Updater(bot=get_bot(config[0]), workers=TG_WORKERS, use_context=True)
         dispatcher = updater.dispatcher
         dispatcher.add_handler(start_handler)
+        pay_watcher.start(check_pay, make_order)
         # dispatcher.add_handler(admin_handler)
         updater.start_polling()
         updater.idle()
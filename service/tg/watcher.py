@@ -0,0 +1,100 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from service.database.models import Order
+from service.api.db import db
+from service.util.order.events import order_events
+
+# 日志记录
+from service.util.log import log
+
+# TG订单支付监视：所有待支付订单放入按下次查询时间排序的堆，由一个调度线程统一派发
+# 网关查询在有界线程池中并发执行，不再每个买家独占一个线程sleep轮询
+WATCH_INTERVAL = int(os.getenv('TG_PAY_INTERVAL', 4))     # 单个订单查询间隔，秒
+WATCH_TIMEOUT = int(os.getenv('TG_PAY_TIMEOUT', 352))     # 超时放弃，秒
+WATCH_WORKERS = int(os.getenv('TG_PAY_WORKERS', 4))       # 同时查询网关的最大线程数
+
+
+class PayWatcher(object):
+    def __init__(self, interval=WATCH_INTERVAL, timeout=WATCH_TIMEOUT, workers=WATCH_WORKERS):
+        self.interval = interval
+        self.timeout = timeout
+        self.workers = workers
+        self.check = None       # check(data)，已支付返回True
+        self.on_paid = None     # on_paid(data)，支付成功后发卡
+        self.stats = {'watched': 0, 'paid': 0, 'settled': 0, 'expired': 0, 'error': 0}
+        self._heap = []     # (下次查询时间, 序号, 截止时间, data)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = 0   # 正在查询的订单数
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = None
+        self._thread = None
+
+    def start(self, check, on_paid):
+        with self._cond:
+            self.check = check
+            self.on_paid = on_paid
+            if self._thread:
+                return
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='tg-pay')
+            self._thread = threading.Thread(target=self._schedule, name='tg-pay-watcher', daemon=True)
+            self._thread.start()
+
+    def watch(self, data):
+        """加入监视，interval秒后首次查询"""
+        c_now = time.time()
+        with self._cond:
+            heapq.heappush(self._heap, (c_now + self.interval, next(self._seq), c_now + self.timeout, data))
+            self.stats['watched'] += 1
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap) + self._running
+
+    def _schedule(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                item = heapq.heappop(self._heap)
+                self._running += 1
+            self._slots.acquire()   # 线程池满时在此等待，到期订单留在本线程依次派发
+            self._pool.submit(self._run, item)
+
+    def _settled(self, out_order_id):
+        # 支付回调已完成发卡则无需再查网关
+        return order_events.is_paid(out_order_id) or Order.query.filter_by(out_order_id=out_order_id).first() is not None
+
+    def _run(self, item):
+        _, seq, deadline, data = item
+        retry = False
+        try:
+            if self._settled(data['out_order_id']):
+                self.stats['settled'] += 1
+            elif self.check(data):
+                self.stats['paid'] += 1
+                self.on_paid(data)
+            elif time.time() + self.interval < deadline:
+                retry = True
+            else:
+                self.stats['expired'] += 1
+        except Exception as e:
+            log(e)
+            self.stats['error'] += 1
+            retry = time.time() + self.interval < deadline
+        finally:
+            db.session.remove()
+            self._slots.release()
+            with self._cond:
+                self._running -= 1
+                if retry:
+                    heapq.heappush(self._heap, (time.time() + self.interval, seq, deadline, data))
+                    self._cond.notify()
+
+
+pay_watcher = PayWatcher()
@@ -0,0 +1,59 @@
+import os
+import hashlib
+import threading
+from queue import Queue
+import telegram
+from flask import Blueprint, request
+from telegram.ext import Dispatcher
+from service.api.db import limiter
+from service.tg.client import get_bot, TG_WORKERS
+from service.tg.tg_faka import get_config, start_handler, check_pay, make_order
+from service.tg.watcher import pay_watcher
+from service.util.pay.pay_config import get_config as pay_config
+
+# 日志记录
+from service.util.log import log
+
+# TG发卡webhook模式：Telegram推送更新到Flask接口，接口只入队即返回，Dispatcher后台线程分发
+# 处理器以run_async在TG_WORKERS个线程内执行，单个网关慢请求不会阻塞其他用户
+# 设置TG_MODE=webhook启用；会话状态保存在进程内存中，webhook模式应只在一个进程内启动
+TG_WEBHOOK_URL = os.getenv('TG_WEBHOOK_URL')    # 对外地址，默认为后台设置的网站地址
+
+tg = Blueprint('tg', __name__)
+_runtime = {}   # token, dispatcher
+
+
+def webhook_secret(token):
+    # 路径中使用token摘要，避免泄露token且无法伪造推送
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+
+def start_webhook():
+    config = get_config()
+    if not config:
+        return None
+    token = config[0]
+    bot = get_bot(token)
+    dispatcher = Dispatcher(bot, Queue(), workers=TG_WORKERS, use_context=True)
+    dispatcher.add_handler(start_handler)
+    threading.Thread(target=dispatcher.start, name='tg-dispatcher', daemon=True).start()
+    pay_watcher.start(check_pay, make_order)
+    _runtime.update(token=token, dispatcher=dispatcher)
+    url = (TG_WEBHOOK_URL or pay_config('web_url')).rstrip('/') + '/tg/webhook/' + webhook_secret(token)
+    bot.set_webhook(url=url, max_connections=TG_WORKERS)
+    return url
+
+
+@tg.route('/tg/webhook/<secret>', methods=['post'])
+@limiter.exempt
+def webhook(secret):
+    dispatcher = _runtime.get('dispatcher')
+    if not dispatcher or secret != webhook_secret(_runtime['token']):
+        return '参数错误', 404
+    try:
+        update = telegram.Update.de_json(request.get_json(force=True), dispatcher.bot)
+    except Exception as e:
+        log(e)
+        return '参数错误', 400
+    dispatcher.update_queue.put(update)
+    return 'ok', 200
@@ -1,16 +1,50 @@
 from sqlalchemy.orm import query
-from service.database.models import TempOrder
+from service.database.models import TempOrder, TempOrderArchive
 from service.api.db import db
 from datetime import datetime,timedelta
+from service.util.order.queue import purge
+from service.util.timeutil import now
+from service.util.log import log
+import os
+import time
+
+# 过期临时订单清理：按updatetime索引分批删除，每批单独提交，批间让出SQLite写锁
+TMP_RETENTION = int(os.getenv('TMP_ORDER_RETENTION_DAYS', 5))   # 保留天数，满TMP_RETENTION+1天才删除，与旧版 .days > 5 一致
+GC_BATCH = int(os.getenv('TMP_ORDER_GC_BATCH', 1000))  # 每批删除行数
+GC_PAUSE = float(os.getenv('TMP_ORDER_GC_PAUSE', 0.05))    # 批间间隔，秒
+TMP_ARCHIVE = os.getenv('TMP_ORDER_ARCHIVE', '0') == '1'   # 已支付临时订单删除前压缩归档
+
+# 最近一次及累计运行情况，后台/gc_status查看
+gc_stats = {'runs': 0, 'total_deleted': 0, 'total_archived': 0, 'last_run': None, 'last_seconds': 0, 'last_deleted': 0, 'last_archived': 0, 'last_batches': 0}
+
 
 def clean_tmp_order():
-    orders = TempOrder.query.all()
-    c_now = datetime.utcnow()+timedelta(hours=8)
-    # del_list = []
-    if orders:
-        with db.auto_commit_db():
-            for i in orders:
-                if (c_now - i.to_date()['updatetime']).days > 5:
-                    # del_list.append(i)
-                    db.session.delete(i)
-        
+    start = time.time()
+    cutoff = now() - timedelta(days=TMP_RETENTION + 1)
+    deleted = archived = batches = 0
+    try:
+        while True:
+            # 不排序，走updatetime索引范围扫描，相当于 DELETE ... WHERE updatetime <= :cutoff LIMIT n
+            rows = db.session.query(TempOrder.id, TempOrder.status).filter(TempOrder.updatetime <= cutoff).limit(GC_BATCH).all()
+            if not rows:
+                break
+            with db.auto_commit_db():
+                paid = [x[0] for x in rows if x[1]]
+                if TMP_ARCHIVE and paid:
+                    db.session.add(TempOrderArchive(TempOrder.query.filter(TempOrder.id.in_(paid)).all()))
+                    archived += len(paid)
+                deleted += TempOrder.query.filter(TempOrder.id.in_([x[0] for x in rows])).delete(synchronize_session=False)
+            batches += 1
+            if len(rows) < GC_BATCH:
+                break
+            time.sleep(GC_PAUSE)
+    except Exception as e:
+        log(e)
+    finally:
+        cost = round(time.time() - start, 3)
+        gc_stats.update({'last_run': now().strftime('%Y-%m-%d %H:%M:%S'), 'last_seconds': cost, 'last_deleted': deleted, 'last_archived': archived, 'last_batches': batches})
+        gc_stats['runs'] += 1
+        gc_stats['total_deleted'] += deleted
+        gc_stats['total_archived'] += archived
+        log(f'临时订单清理：删除{deleted}条，归档{archived}条，{batches}批，耗时{cost}s')
+    purge()  # 清理已完成的发卡任务
@@ -0,0 +1,131 @@
+import io
+import os
+import csv
+import json
+import zlib
+from datetime import datetime
+from flask import Response, stream_with_context
+from service.database.models import Order, Card
+from service.api.db import db
+from service.util.timeutil import day_range, in_range
+
+# 流式导出：yield_per分批读取，边查边写，内存占用与数据量无关
+EXPORT_BATCH = int(os.getenv('EXPORT_BATCH', 1000))   # 每批读取行数
+FLUSH_ROWS = 200    # 每累计多少行输出一次，避免逐行产生过多小块
+
+ORDER_FIELDS = ['out_order_id', 'name', 'payment', 'contact', 'contact_txt', 'price', 'num', 'total_price', 'card', 'status', 'updatetime']
+CARD_FIELDS = ['id', 'prod_name', 'card', 'reuse', 'isused']
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def parse_day(value):
+    """'2021-01-31' ==> datetime，空值返回None，格式错误抛ValueError"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def order_query(start=None, end=None, name=None):
+    # 日期区间按天，包含结束当天
+    query = db.session.query(*[getattr(Order, x) for x in ORDER_FIELDS])
+    query = in_range(query, Order.updatetime, *day_range(start, end))
+    if name:
+        query = query.filter(Order.name == name)
+    return query.order_by(Order.id)
+
+
+def card_query(name=None, isused=None):
+    query = db.session.query(*[getattr(Card, x) for x in CARD_FIELDS])
+    if name:
+        query = query.filter(Card.prod_name == name)
+    if isused is not None:
+        query = query.filter(Card.isused == isused)
+    return query.order_by(Card.id)
+
+
+def iter_rows(query, batch=EXPORT_BATCH):
+    return query.yield_per(batch)
+
+
+def format_value(x):
+    if isinstance(x, datetime):
+        return x.strftime('%Y-%m-%d %H:%M:%S')
+    return x
+
+
+def iter_csv(rows, fields):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write('\ufeff')     # BOM，Excel直接打开不乱码
+    writer.writerow(fields)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([format_value(x) for x in row])
+        if i % FLUSH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def iter_ndjson(rows, fields):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({k: format_value(v) for k, v in zip(fields, row)}, ensure_ascii=False))
+        if len(lines) >= FLUSH_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_gzip(chunks):
+    # wbits=31 输出gzip格式
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(rows, fields, fmt='csv', gz=False):
+    """行迭代器 ==> 字节块迭代器"""
+    chunks = iter_csv(rows, fields) if fmt == 'csv' else iter_ndjson(rows, fields)
+    chunks = (x.encode('utf-8') for x in chunks)
+    if gz:
+        chunks = iter_gzip(chunks)
+    return chunks
+
+
+def export_response(query, fields, filename, fmt='csv', gz=False):
+    if fmt not in FORMATS:
+        raise ValueError(fmt)
+    filename = filename + '.' + fmt + ('.gz' if gz else '')
+    body = stream_with_context(iter_export(iter_rows(query), fields, fmt, gz))
+    res = Response(body, mimetype='application/gzip' if gz else FORMATS[fmt])
+    res.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return res
+
+
+def text_response(chunks, filename, gz=False):
+    """文本块迭代器 ==> 流式下载响应，兼容原备份接口的txt格式"""
+    chunks = (x.encode('utf-8') for x in chunks)
+    if gz:
+        chunks = iter_gzip(chunks)
+    res = Response(stream_with_context(chunks), mimetype='application/gzip' if gz else 'text/plain')
+    res.headers["Content-Disposition"] = f"p_w_upload; filename={filename}.txt" + ('.gz' if gz else '')
+    return res
+
+
+def write_export(path, query, fields, fmt='csv', gz=False):
+    """导出到服务器文件，返回写入行数"""
+    count = [0]
+
+    def rows():
+        for row in iter_rows(query):
+            count[0] += 1
+            yield row
+    with open(path, 'wb') as f:
+        for chunk in iter_export(rows(), fields, fmt, gz):
+            f.write(chunk)
+    return count[0]
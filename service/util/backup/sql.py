@@ -1,8 +1,11 @@
 from flask import make_response
 from service.database.models import *
 from service.api.db import db
+from service.util.backup.export import ORDER_FIELDS, order_query, card_query, iter_rows, format_value
+from service.util.log import log
 import os
 from shutil import copy
+from itertools import chain
 import time
 
 BACKUP_PATH = os.path.join(os.path.dirname(__file__),'../../../public/backups')
@@ -84,47 +87,48 @@ def cag_backup():
 # 商品设置
 def shop_backup():
     # id,名称，分类，一句话描述，图片展示，排序，内容介绍，价格，发货模式，上线状态
-    txt = '\n【=====商品备份=====】'
+    lines = ['\n【=====商品备份=====】']
     try:
         res = ProdInfo.query.filter().all()
         tmps = [x.admin_edit() for x in res]
         for i in tmps:
-            txt += '\n【'+ i['name']+'】---所属分类：'+i['cag_name']+'---一句话描述：'+i['info']+'---一展示图片：'+i['img_url']+'---一价格：'+str(i['price'])+'---发货模式：'+str(i['auto'])+'---是否上架：'+str(i['isactive'])
-            txt += '\n------商品详细描述：'+i['discription']
-        return txt
+            lines.append('\n【'+ i['name']+'】---所属分类：'+i['cag_name']+'---一句话描述：'+i['info']+'---一展示图片：'+i['img_url']+'---一价格：'+str(i['price'])+'---发货模式：'+str(i['auto'])+'---是否上架：'+str(i['isactive']))
+            lines.append('\n------商品详细描述：'+i['discription'])
+        return ''.join(lines)
     except:
-        return txt        
+        return ''.join(lines)
 
-# 卡密信息
-def card_backup():
+# 卡密信息：分批读取逐行输出，不在内存中拼接整表
+def iter_card_backup(name=None):
     # 商品名称+是否重复，\n卡密信息，
-    txt = '\n【=====卡密信息备份=====】'
+    yield '\n【=====卡密信息备份=====】'
     try:
-        res = Card.query.filter_by(isused = False).all()
-        tmps = [x.to_json() for x in res]
-        prod_names = [] #暂存商品列表
-        for i in tmps:
-            if i['prod_name'] not in prod_names:
-                prod_names.append(i['prod_name'])
-                txt += '\n【'+ i['prod_name']+'】---是否重复：'+str(i['reuse'])+' 卡密信息：'
-            txt += '\n'+str(i['card'])
-        return txt
-    except:
-        return txt        
+        query = card_query(name, isused=False).order_by(None).order_by(Card.prod_name, Card.id)
+        prod_name = None    #当前商品
+        for _, prod, card, reuse, _ in iter_rows(query):
+            if prod != prod_name:
+                prod_name = prod
+                yield '\n【'+ prod+'】---是否重复：'+str(reuse)+' 卡密信息：'
+            yield '\n'+str(card)
+    except Exception as e:
+        log(e)
+
+def card_backup():
+    return ''.join(iter_card_backup())
 
 # 订单列表
-def order_backup():
+def iter_order_backup(start=None, end=None, name=None):
     # 此部分不支持再次导入。
-    txt = '\n【=====订单信息备份=====】'
+    yield '<---  此部分导出后，升级不再支持导入 ---->'
     try:
-        txt = '<---  此部分导出后，升级不再支持导入 ---->'
-        res = Order.query.filter().all()
-        tmps = [x.admin_json2() for x in res]
-        for i in tmps:
-            txt += '\n订单时间:'+str(i['updatetime'])+'订单ID：'+ i['out_order_id']+'---【'+i['name']+'】---支付渠道:'+i['payment']+'---联系方式:'+str(i['contact'])+'---购买数量:'+str(i['num'])+'---总价格:'+str(i['total_price'])+'---卡密:'+str(i['card'])
-        return txt
-    except:
-        return txt     
+        for i in iter_rows(order_query(start, end, name)):
+            i = dict(zip(ORDER_FIELDS, i))
+            yield '\n订单时间:'+format_value(i['updatetime'])+'订单ID：'+ i['out_order_id']+'---【'+i['name']+'】---支付渠道:'+i['payment']+'---联系方式:'+str(i['contact'])+'---购买数量:'+str(i['num'])+'---总价格:'+str(i['total_price'])+'---卡密:'+str(i['card'])
+    except Exception as e:
+        log(e)
+
+def order_backup():
+    return ''.join(iter_order_backup())
 #路径设置
 SQL_PATH = os.path.join(os.path.dirname(__file__),'../../public/sql')           
 def order_backup_sql():
@@ -217,13 +221,13 @@ def loc_sys_back(): #系统信息备份
     return payment_backup()+smtp_backup()+notice_backup()+system_backup()
 
 
-def loc_shop_back(): #商品卡密备份
+def loc_shop_back(name=None): #商品卡密备份，返回文本块迭代器
     # return make_file(cag_backup()+shop_backup()+card_backup(),'商品及卡密信息备份')
-    return cag_backup()+shop_backup()+card_backup()
+    return chain([cag_backup(), shop_backup()], iter_card_backup(name))
 
-def loc_order_back(): #订单备份
+def loc_order_back(start=None, end=None, name=None): #订单备份，返回文本块迭代器
     # return make_file(order_backup(),'订单导出')
-    return order_backup()
+    return iter_order_backup(start, end, name)
 
 def main_back():    # 服务器端备份
     #开始备份系统信息
@@ -232,10 +236,10 @@ def main_back():    # 服务器端备份
         f.write(payment_backup()+smtp_backup()+notice_backup()+system_backup()) #写入系统配置
 
     with open(BACKUP_PATH+'/商品分类等卡密备份'+backup_time+'.txt','w',encoding='utf-8') as f:
-        f.write(cag_backup()+shop_backup()+card_backup()) #写入系统配置
+        f.writelines(loc_shop_back()) #写入系统配置
 
     with open(BACKUP_PATH+'/历史订单信息备份'+backup_time+'.txt','w',encoding='utf-8') as f:
-        f.write(order_backup()) #写入系统配置        
+        f.writelines(loc_order_back()) #写入系统配置        
     
     # 文件操作
     images_backup()
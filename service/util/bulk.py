@@ -0,0 +1,73 @@
+import os
+import csv
+import gzip
+import time
+from service.api.db import db
+from service.util.backup.sql import BACKUP_PATH
+from service.util.backup.export import format_value
+
+# 批量删除：集合式 DELETE ... WHERE id IN (...)，分块执行并逐块提交，避免长事务与超出绑定参数上限
+# archive=True 时删除前将整行写入 public/backups 下的 csv.gz，与删除同批次进行，归档内容即实际删除的行
+DELETE_CHUNK = int(os.getenv('DELETE_CHUNK', 5000))
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+def archive_fields(fields):
+    # 归档列：字段列表不含id时补在最前，避免重复
+    return fields if 'id' in fields else ['id'] + fields
+
+
+def _batches(model, fields, ids, criteria, chunk, archive):
+    # 每次产出(本批id, 本批整行或None)
+    fields = archive_fields(fields) if archive else ['id']
+    columns = [getattr(model, x) for x in fields]
+    key = fields.index('id')
+    if ids is not None:
+        for part in _chunks(ids, chunk):
+            if not archive:
+                yield part, None
+                continue
+            rows = db.session.query(*columns).filter(model.id.in_(part)).order_by(model.id).all()
+            yield [x[key] for x in rows], rows
+        return
+    last = 0
+    while True:     # 按id递增定位下一批，删除后无需重复扫描已处理区间
+        query = db.session.query(*columns).filter(model.id > last, *criteria)
+        rows = query.order_by(model.id).limit(chunk).all()
+        if not rows:
+            return
+        last = rows[-1][key]
+        yield [x[key] for x in rows], rows if archive else None
+
+
+def archive_path(table):
+    return os.path.join(BACKUP_PATH, f"{table}_{time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime())}.csv.gz")
+
+
+def bulk_delete(model, fields, ids=None, criteria=(), archive=False, chunk=DELETE_CHUNK):
+    """按id列表或条件批量删除，返回(删除行数, 归档文件路径或None)"""
+    path = None
+    writer = None
+    f = None
+    deleted = 0
+    try:
+        for part, rows in _batches(model, fields, ids, criteria, chunk, archive):
+            if archive and rows:
+                if writer is None:
+                    path = archive_path(model.__tablename__)
+                    os.makedirs(BACKUP_PATH, exist_ok=True)
+                    f = gzip.open(path, 'wt', encoding='utf-8-sig', newline='')
+                    writer = csv.writer(f)
+                    writer.writerow(archive_fields(fields))
+                writer.writerows([[format_value(x) for x in row] for row in rows])
+                f.flush()   # 先落盘再删除
+            with db.auto_commit_db():
+                deleted += model.query.filter(model.id.in_(part), *criteria).delete(synchronize_session=False)
+    finally:
+        if f:
+            f.close()
+    return deleted, path
@@ -0,0 +1,117 @@
+import os
+import csv
+import uuid
+import codecs
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from service.database.models import Card
+from service.api.db import db
+from service.util.card.stock import adjust_stock
+from service.util.catalog import catalog
+from service.util.paginate import invalidate_count
+
+# 日志记录
+from service.util.log import log
+
+# 卡密批量导入：逐行读取上传文件，按批次Core executemany写入，每批提交一次并回报进度
+# 同商品未使用卡密按内容哈希去重，哈希集合只存16字节摘要，不保留卡密原文
+IMPORT_BATCH = int(os.getenv('IMPORT_BATCH', 5000))    # 每批写入行数
+# 导入任务在后台线程执行，上传文件先落盘；浏览器断开不影响导入，进度通过任务ID查询
+IMPORT_JOBS_KEEP = 100  # 保留最近的任务进度
+
+executor = ThreadPoolExecutor(1)    # 导入任务串行执行，避免并发写锁冲突
+_lock = threading.Lock()
+_jobs = OrderedDict()   # 任务ID ==> 进度
+
+
+def digest(card):
+    return hashlib.md5(card.encode('utf-8')).digest()
+
+
+def existing_digests(prod_name, batch=IMPORT_BATCH):
+    query = db.session.query(Card.card).filter(Card.prod_name == prod_name, Card.isused == False)
+    return {digest(x[0]) for x in query.yield_per(batch)}
+
+
+def read_lines(stream, csv_mode=False):
+    """上传文件流 ==> 卡密行迭代器；csv取每行第一列，自动去除UTF-8 BOM"""
+    text = codecs.getreader('utf-8-sig')(stream, errors='replace')
+    if csv_mode:
+        for row in csv.reader(text):
+            yield row[0] if row else ''
+    else:
+        for line in text:
+            yield line
+
+
+def _insert(rows):
+    with db.auto_commit_db():
+        db.session.execute(Card.__table__.insert(), rows)
+        adjust_stock(rows[0]['prod_name'], len(rows), restock=True)
+
+
+def import_cards(prod_name, lines, batch=IMPORT_BATCH):
+    """导入卡密，每写入一批yield一次进度{read,inserted,duplicate,blank}，最后一次带done"""
+    seen = existing_digests(prod_name, batch)
+    stats = {'read': 0, 'inserted': 0, 'duplicate': 0, 'blank': 0}
+    rows = []
+    for line in lines:
+        stats['read'] += 1
+        card = line.strip()
+        if not card:
+            stats['blank'] += 1
+            continue
+        key = digest(card)
+        if key in seen:     # 与库存或本次上传重复
+            stats['duplicate'] += 1
+            continue
+        seen.add(key)
+        rows.append({'prod_name': prod_name, 'card': card, 'reuse': False, 'isused': False})
+        if len(rows) >= batch:
+            _insert(rows)
+            stats['inserted'] += len(rows)
+            rows = []
+            yield dict(stats)
+    if rows:
+        _insert(rows)
+        stats['inserted'] += len(rows)
+    yield dict(stats, done=True)
+
+
+def _run_job(job_id, prod_name, path, csv_mode):
+    job = _jobs[job_id]
+    try:
+        with open(path, 'rb') as f:
+            for stats in import_cards(prod_name, read_lines(f, csv_mode)):
+                job.update(stats)
+    except Exception as e:
+        log(e)
+        job['error'] = '数据库异常'
+    finally:
+        os.remove(path)
+        db.session.remove()
+        catalog.invalidate()   # 前台目录缓存失效
+        invalidate_count(Card.__tablename__)    # 后台列表计数缓存失效
+        job['done'] = True
+
+
+def start_import(prod_name, stream, csv_mode=False):
+    """上传流写入临时文件后提交后台导入，返回任务ID"""
+    with tempfile.NamedTemporaryFile(prefix='import_', delete=False) as f:
+        shutil.copyfileobj(stream, f)
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _jobs[job_id] = {'prod_name': prod_name, 'read': 0, 'inserted': 0, 'duplicate': 0, 'blank': 0, 'done': False}
+        while len(_jobs) > IMPORT_JOBS_KEEP:
+            _jobs.popitem(last=False)
+    executor.submit(_run_job, job_id, prod_name, f.name, csv_mode)
+    return job_id
+
+
+def import_status(job_id):
+    job = _jobs.get(job_id)
+    return dict(job, job=job_id) if job else None
@@ -0,0 +1,67 @@
+from sqlalchemy.exc import IntegrityError
+from service.database.models import Card, ProductStock, count_card_stock
+from service.api.db import db
+from service.util.log import log
+from service.util.timeutil import now
+
+# 库存计数维护：领取、导入走增量更新；后台编辑按商品重新统计；reconcile_stock定时对账修复偏差
+# 均在调用方事务内执行，与卡密变更同时提交或回滚
+
+
+def _upsert(prod_name, values):
+    if ProductStock.query.filter_by(prod_name=prod_name).update(values, synchronize_session=False):
+        return
+    try:
+        with db.auto_commit_db():   # 保存点内插入，并发插入冲突则改为更新
+            db.session.add(ProductStock(prod_name, values['unused'], values['reuse'], values.get('restock_time')))
+    except IntegrityError:
+        ProductStock.query.filter_by(prod_name=prod_name).update(values, synchronize_session=False)
+
+
+def refresh_stock(prod_names, restock=False):
+    """按卡密表重新统计指定商品，restock=True同时记录补货时间"""
+    prod_names = [x for x in set(prod_names) if x]
+    if not prod_names:
+        return
+    stock = count_card_stock(prod_names)
+    c_now = now()
+    for name in prod_names:
+        unused, reuse = stock.get(name, (0, False))
+        values = {'unused': unused, 'reuse': reuse, 'updatetime': c_now}
+        if restock:
+            values['restock_time'] = c_now
+        _upsert(name, values)
+
+
+def adjust_stock(prod_name, delta, restock=False):
+    """未使用卡密数增减delta；计数行不存在时按卡密表统计创建"""
+    c_now = now()
+    values = {'unused': ProductStock.unused + delta, 'updatetime': c_now}
+    if restock:
+        values['restock_time'] = c_now
+    if not ProductStock.query.filter_by(prod_name=prod_name).update(values, synchronize_session=False):
+        refresh_stock([prod_name], restock)
+
+
+def card_products(ids, size=500):
+    """卡密id列表 ==> 所属商品名集合，删除前调用"""
+    names = set()
+    for i in range(0, len(ids), size):
+        names.update(x[0] for x in db.session.query(Card.prod_name).filter(Card.id.in_(ids[i:i+size])).distinct())
+    return names
+
+
+def reconcile_stock():
+    """对账：全量统计与计数表比较，修复偏差及缺失行，返回修复的商品数"""
+    try:
+        actual = count_card_stock()
+        counters = {x.prod_name: (x.unused, bool(x.reuse)) for x in ProductStock.query.all()}
+        drift = [x for x in set(actual) | set(counters) if actual.get(x, (0, False)) != counters.get(x)]
+        if drift:
+            with db.auto_commit_db():
+                refresh_stock(drift)   # 事务内按商品重新统计，缩小与并发领取的竞争窗口
+            log(f'库存计数对账修复{len(drift)}个商品：{drift[:10]}')
+        return len(drift)
+    except Exception as e:
+        log(e)
+        return 0
@@ -0,0 +1,50 @@
+import os
+import time
+import hashlib
+import threading
+from flask import json, request, Response
+
+# 前台目录缓存：theme_list、get_system、detail等只在后台修改时变化，序列化后的JSON字节常驻内存
+# 后台修改接口调用invalidate()使版本号+1；多进程部署时各进程独立，TTL兜底保证最终一致
+CATALOG_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60))  # 秒，0为关闭缓存
+# 浏览器/CDN缓存策略，配合ETag做304协商
+CATALOG_CACHE_CONTROL = os.getenv('CATALOG_CACHE_CONTROL', 'public, max-age=10, stale-while-revalidate=60')
+
+
+class CatalogCache(object):
+    def __init__(self, ttl=CATALOG_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.Lock()
+        self._data = {}     # key ==> (版本号, 过期时间, JSON字节, ETag)
+
+    def get(self, key, builder):
+        """返回(JSON字节, ETag)；未命中、过期或版本变化时调用builder()重建"""
+        entry = self._data.get(key)
+        now = time.time()
+        if entry and entry[0] == self.version and entry[1] > now:
+            return entry[2], entry[3]
+        version = self.version  # 先记录版本，重建期间若被invalidate则不覆盖新数据
+        body = json.dumps(builder()).encode('utf-8')
+        etag = hashlib.md5(body).hexdigest()   # 内容哈希，内容不变则ETag不变
+        if self.ttl > 0:
+            with self._lock:
+                if version == self.version:
+                    self._data[key] = (version, now + self.ttl, body, etag)
+        return body, etag
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._data = {}
+
+
+catalog = CatalogCache()
+
+
+def cached_response(body, etag, cache_control=CATALOG_CACHE_CONTROL):
+    """带ETag与Cache-Control的JSON响应，If-None-Match命中时返回304"""
+    resp = Response(body, mimetype='application/json')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = cache_control
+    return resp.make_conditional(request)
@@ -0,0 +1,28 @@
+import ast
+import json
+import copy
+from functools import lru_cache
+
+# 配置字段(Payment/Plugin/Notice.config)统一以JSON文本存储，取代eval(str(dict))
+# 解析结果按原始文本缓存：行内容不变则命中，后台修改后文本变化自动重新解析
+
+
+@lru_cache(maxsize=256)
+def _parse(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        # 兼容未迁移的旧数据str(dict)，literal_eval只接受字面量，不执行代码
+        return ast.literal_eval(text)
+
+
+def load_config(text):
+    """配置文本 ==> dict；返回副本，调用方修改不影响缓存"""
+    if not text:
+        return {}
+    return copy.deepcopy(_parse(text))
+
+
+def dump_config(config):
+    """dict ==> JSON文本，中文原样保存"""
+    return json.dumps(config, ensure_ascii=False)
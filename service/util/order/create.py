@@ -1,6 +1,6 @@
 from enum import auto
 from os import name
-from service.database.models import TempOrder
+from service.database.models import TempOrder, ProdInfo
 from service.api.db import db
 
 # 调用支付接口
@@ -17,29 +17,37 @@ from service.util.pay.yungouos.yungou import YunGou
 from service.util.pay.vmq.vmpay import VMQ  # V免签
 from service.util.pay.stripe.api import Stripe
 from service.util.pay.yunmq.ymq import Ymq
+from service.util.pay.registry import gateway   # 网关对象缓存
 
 # 日志记录
 from service.util.log import log
-from service.util.order.handle import make_order, notify_success
+from service.util.order.handle import make_order
+from service.util.order.queue import enqueue
 from concurrent.futures import ThreadPoolExecutor
 executor = ThreadPoolExecutor(8)
 
 
 def make_tmp_order(out_order_id, name, payment, contact, contact_txt, num):
     try:
+        shop = ProdInfo.query.filter_by(name=name).first()
+        if not shop:
+            return False
+        order = TempOrder(out_order_id, name, payment,
+                          contact, contact_txt, num, status=False, endtime=None, shop=shop)
+        res = order.to_json()   # 提交前取值，避免提交后属性过期重新查询
         with db.auto_commit_db():
-            db.session.add(TempOrder(out_order_id, name, payment,
-                           contact, contact_txt, num, status=False, endtime=None))
-        return make_pay_url(out_order_id)
+            db.session.add(order)
+        return make_pay_url(out_order_id, res)
     except Exception as e:
         log(e)
         return False
 
 
-def make_pay_url(out_order_id):
-    order = TempOrder.query.filter_by(out_order_id=out_order_id).first()
-    if order:
-        res = order.to_json()
+def make_pay_url(out_order_id, res=None):
+    if res is None:
+        order = TempOrder.query.filter_by(out_order_id=out_order_id).first()
+        res = order.to_json() if order else None
+    if res:
         # print(res)
         # if res['status'] == False:
         #     return False
@@ -59,14 +67,14 @@ def pay_url(payment, name, out_order_id, total_price):
     try:
         if payment == '支付宝当面付':
             # return jsonify({'qr_code':'455555555454deffffffff'})
-            r = AlipayF2F().create_order(name, out_order_id, total_price)
+            r = gateway(AlipayF2F).create_order(name, out_order_id, total_price)
         elif payment == '虎皮椒微信':
-            r = Hupi().Pay(trade_order_id=out_order_id, total_fee=total_price, title=name)
+            r = gateway(Hupi).Pay(trade_order_id=out_order_id, total_fee=total_price, title=name)
         elif payment == '虎皮椒支付宝':
-            r = Hupi(payment='alipay').Pay(
+            r = gateway(Hupi, payment='alipay').Pay(
                 trade_order_id=out_order_id, total_fee=total_price, title=name)
         elif payment == '迅虎微信':
-            r = Xunhu(payment='wechat').Pay(
+            r = gateway(Xunhu, payment='wechat').Pay(
                 trade_order_id=out_order_id, total_fee=total_price, title=name)
         elif payment in ['码支付微信', '码支付支付宝', '码支付QQ']:
             if payment == '码支付微信':
@@ -75,26 +83,26 @@ def pay_url(payment, name, out_order_id, total_price):
                 payname = 'alipay'
             else:
                 payname = 'qqpay'
-            r = CodePay(payment=payname).create_order(
+            r = gateway(CodePay, payment=payname).create_order(
                 payment, out_order_id, total_price)
         elif payment in ['PAYJS支付宝', 'PAYJS微信']:
             if payment == 'PAYJS支付':
                 payname = 'alipay'
             else:
                 payname = 'wechat'
-            r = Payjs(payment=payname).create_order(
+            r = gateway(Payjs, payment=payname).create_order(
                 name, out_order_id, total_price)
         elif payment in ['V免签支付宝', 'V免签微信']:
             # 参数错误情况下，会失效
             if payment == 'V免签微信':
-                r = VMQ().create_order(name, out_order_id, total_price)
+                r = gateway(VMQ).create_order(name, out_order_id, total_price)
             else:
-                r = VMQ(payment='alipay').create_order(
+                r = gateway(VMQ, payment='alipay').create_order(
                     name, out_order_id, total_price)
         elif payment in ['微信官方接口']:
-            r = Wechat().create_order(name, out_order_id, total_price)
+            r = gateway(Wechat).create_order(name, out_order_id, total_price)
         elif payment in ['QQ钱包']:
-            r = QQpay().create_order(name, out_order_id, total_price)
+            r = gateway(QQpay).create_order(name, out_order_id, total_price)
         elif payment in ['易支付支付宝', '易支付QQ', '易支付微信']:
             if payment == '易支付支付宝':
                 payname = 'alipay'
@@ -102,21 +110,21 @@ def pay_url(payment, name, out_order_id, total_price):
                 payname = 'wechat'
             else:
                 payname = 'qqpay'
-            r = Epay(payment=payname).create_order(
+            r = gateway(Epay, payment=payname).create_order(
                 name, out_order_id, total_price)
         elif payment in ['Mugglepay']:
-            r = Mugglepay().create_order(name, out_order_id, total_price)
+            r = gateway(Mugglepay).create_order(name, out_order_id, total_price)
         elif payment in ['YunGouOS']:   # 统一接口
-            r = YunGou(payment='unity').create_order(
+            r = gateway(YunGou, payment='unity').create_order(
                 name, out_order_id, total_price)
         elif payment in ['YunGouOS_WXPAY']:   # 微信接口
-            r = YunGou().create_order_wxpay(name, out_order_id, total_price)
+            r = gateway(YunGou).create_order_wxpay(name, out_order_id, total_price)
         elif payment in ['Stripe支付宝', 'Stripe微信']:   # 微信接口
             if payment == 'Stripe微信':
-                r = Stripe(payment='wechat').create_order(
+                r = gateway(Stripe, payment='wechat').create_order(
                     name, out_order_id, total_price)
             else:
-                r = Stripe(payment='alipay').create_order(
+                r = gateway(Stripe, payment='alipay').create_order(
                     name, out_order_id, total_price)    # 导入cource_id和clinent_key[]合并
             if r:
                 with db.auto_commit_db():
@@ -125,10 +133,10 @@ def pay_url(payment, name, out_order_id, total_price):
                 r.pop('signs')
         elif payment in ['云免签微信', '云免签支付宝']:
             if payment == '云免签微信':
-                r = Ymq(payment='wechat').create_order(
+                r = gateway(Ymq, payment='wechat').create_order(
                     name, out_order_id, total_price)
             else:
-                r = Ymq(payment='alipay').create_order(
+                r = gateway(Ymq, payment='alipay').create_order(
                     name, out_order_id, total_price)
         else:
             return None
@@ -139,9 +147,9 @@ def pay_url(payment, name, out_order_id, total_price):
 
 
 def alipay_check(out_order_id):
-    r = AlipayF2F().check(out_order_id)
+    r = gateway(AlipayF2F).check(out_order_id)
     if r:
-        executor.submit(notify_success, out_order_id)
+        enqueue(out_order_id)
         return True
     return False
 
@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# 进程内支付事件：发卡完成后publish，等待中的长轮询/SSE请求立即返回，等待期间不查询数据库
+# 多进程部署时只能唤醒本进程的等待者，其余请求超时后由接口查询一次数据库兜底
+PAID_KEEP = int(os.getenv('PAY_EVENT_KEEP', 600))    # 已支付记录保留秒数，覆盖晚于publish才开始等待的请求
+PAID_MAX = 10000
+
+
+class OrderEvents(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}  # out_order_id ==> {threading.Event}
+        self._paid = OrderedDict()  # out_order_id ==> 支付时间，按时间先后
+
+    def _trim(self, now):
+        while self._paid and (len(self._paid) > PAID_MAX or next(iter(self._paid.values())) < now - PAID_KEEP):
+            self._paid.popitem(last=False)
+
+    def publish(self, out_order_id):
+        now = time.time()
+        with self._lock:
+            self._paid[out_order_id] = now
+            self._paid.move_to_end(out_order_id)
+            self._trim(now)
+            waiters = self._waiters.pop(out_order_id, ())
+        for event in waiters:
+            event.set()
+
+    def is_paid(self, out_order_id):
+        with self._lock:
+            paid = self._paid.get(out_order_id)
+        return paid is not None and paid >= time.time() - PAID_KEEP
+
+    def wait(self, out_order_id, timeout):
+        """阻塞至该订单publish或超时，返回是否已支付"""
+        event = threading.Event()
+        with self._lock:
+            if out_order_id in self._paid:
+                return True
+            self._waiters.setdefault(out_order_id, set()).add(event)
+        try:
+            return event.wait(timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(out_order_id)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[out_order_id]
+
+    def waiting(self):
+        with self._lock:
+            return sum(len(x) for x in self._waiters.values())
+
+
+order_events = OrderEvents()
@@ -1,5 +1,6 @@
 from service.database.models import Card, Notice,Order,TempOrder
 from service.api.db import db
+from service.util.order.reserve import claim_cards
 import re
 #接口调用
 from service.util.message.smtp import mail_to_user,mail_to_admin
@@ -13,130 +14,100 @@ executor = ThreadPoolExecutor(2)
 
 #日志记录
 from service.util.log import log
+from service.util.catalog import catalog
+from service.util.stats import record_order
+from service.util.order.events import order_events
 
 
 def notify_success(out_order_id):
-    # 更新状态
+    # 同步发卡，异常只记录；支付回调走发卡队列fulfil_order，失败可重试
     try:
-        res = TempOrder.query.filter_by(out_order_id = out_order_id,status = False).first()
-        if res:
-            # 生成实际卡密
-            name = res.name
-            payment = res.payment
-            contact = res.contact
-            contact_txt = res.contact_txt
-            price = res.price
-            num = res.num
-            total_price = res.total_price
-            auto = res.auto        
-            with db.auto_commit_db():   # 更新卡密状态
-                TempOrder.query.filter_by(out_order_id = out_order_id).update({'status':True})
-
-            make_order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,auto)
+        fulfil_order(out_order_id)
     except Exception as e:
-        print(e)
         log(e)
 
+def fulfil_order(out_order_id):
+    # 发卡队列调用：已发货或无对应临时订单时直接返回；失败抛出异常，由队列重试
+    res = TempOrder.query.filter_by(out_order_id = out_order_id).first()
+    if not res or Order.query.filter_by(out_order_id = out_order_id).first():
+        return
+    # 领取订单、领取卡密、写入订单同一事务：任一步失败或进程崩溃都整体回滚，订单状态不会停在已支付而订单缺失
+    with db.auto_commit_db():
+        claimed = TempOrder.query.filter_by(out_order_id = out_order_id,status = False).update({'status':True})
+        if not claimed:
+            raise RuntimeError(f'{out_order_id}正在由其他任务发卡')   # 对方事务未提交，稍后重试时订单已存在则直接返回
+        data = create_order(out_order_id,res.name,res.payment,res.contact,res.contact_txt,res.price,res.num,res.total_price,res.auto)
+    send_order(data,res.auto)   # 提交后再通知
+    order_events.publish(out_order_id)  # 唤醒等待支付结果的请求
+
 #创建订单--走数据库
 def make_order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,auto):
+    with db.auto_commit_db():
+        data = create_order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,auto)
+    send_order(data,auto)
+
+def create_order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,auto):
     # print('后台正在创建卡密')
     #订单ID，商品名称，支付方式，联系方式、备注、单价、数量、总价
     ## 根据name查找对应的卡密信息。---卡密有重复
     # 为避免同一订单二次请求，判断是否重复
-    if not (Order.query.filter_by(out_order_id = out_order_id).first()):
-        status = True   #订单状态
+    if Order.query.filter_by(out_order_id = out_order_id).first():
+        return None
+    status = True   #订单状态
+    #订单创建--领取卡密与写入订单同一事务，写入失败时异常抛出，领取一并回滚
+    with db.auto_commit_db():
         # 生成订单 --除了上述内容外，还需要卡密。
-        if auto:    # 自动发货--获取卡密
+        if auto:    # 自动发货--原子领取卡密，避免并发回调重复发放同一卡密
             nums = int(num)
-            if nums ==1:
-                    result = Card.query.filter_by(prod_name = name,isused = False).first()  #此处可用用0，也可以用false
-                    if result:
-                        card = result.to_json()['card']
-                        reuse = result.to_json()['reuse']   #返回True或False
-                        if not reuse: #卡密状态修改
-                            with db.auto_commit_db():
-                                Card.query.filter_by(id = result.to_json()['id']).update({'isused':True})
-                    else:
-                        card = None
-                        status = False
-                        # print('卡密为空')
-                        log(f'{contact}购买的{name}缺货，卡密信息为空')
-
+            cards, reuse = claim_cards(name, nums)
+            if not cards:
+                card = None
+                status = False
+                # print('卡密为空')
+                log(f'{contact}购买的{name}缺货，卡密信息为空')
+            elif nums == 1:
+                card = cards[0]
+            elif reuse:
+                # 重复使用卡密情况下
+                card = (cards[0]+',')*nums  #解决5~10W卡密重复行问题0.011s;50w消耗47ms--前端轮询4s一次
             else:
-                # 处理数量订单- 卡密查询，数量大于1，重复卡密：-重复发送；不重复卡密：给出结果或空白
-                result = Card.query.filter_by(prod_name = name,isused = False).first()  #先查询一个，判定是否重复
-                if result:
-                    
-                    if result.to_json()['reuse']: #判定是否重复使用
-                        # 重复使用卡密情况下
-                        pre_card = result.to_json()['card']
-                        # card = str([pre_card for i in range(nums)])
-                        card = (pre_card+',')*nums  #解决5~10W卡密重复行问题0.011s;50w消耗47ms--前端轮询4s一次
-                        # 其余相同
-                        
-                        
-                    else:
-                        # 不重复卡密情况 - 查询多个结果，给出卡密列表；更新这些卡密的使用状态
-                        result = Card.query.filter_by(prod_name = name,isused = False).limit(nums).all()
-                        pre_card = [i.to_json()['card'] for i in result]    #数量可能少于实际数量
-                        if len(pre_card) == nums:
-                            # card = str(pre_card)[1:-1]  # 移除双【】
-                            card = ','.join(pre_card)
-                        else:
-                            # card = str(pre_card + [None for x in range(nums-len(pre_card))])[1:-1]
-                            card = ','.join(pre_card + [None for x in range(nums-len(pre_card))])
-                            log(f'{name}已缺货')
-                        # 更新已用卡密状态
-                        # 120单测试--55ms；
-                        # for y in result:
-                        #     Card.query.filter_by(id = y.to_json()['id']).update({'isused':False})      
-                        # 2. 
-                        # [Card.query.filter_by(id = y.to_json()['id']).update({'isused':False}) for y in result] #53ms
-                        # with db.auto_commit_db():     -- 疑似多单时不生效
-                        #     for y in result:
-                        #         y.isused = True
-                        with db.auto_commit_db():
-                            for y in result:
-                                Card.query.filter_by(id = y.to_json()['id']).update({'isused':True})                      
-                        # db.auto_commit_db() #1.9ms--9ms---此步骤在后续commmit时生效
-                        # [y.isused=False for y in result]
-                else:
-                    card = None
-                    status = False
-                    # print('卡密为空')
-                    log(f'{contact}购买的{name}缺货，卡密信息为空')
+                # 不重复卡密情况 - 给出卡密列表，数量可能少于实际数量
+                card = ','.join(cards)
+                if len(cards) < nums:
+                    log(f'{name}已缺货')
         else:   # 手动发货模式--卡密信息
             card = '手工发货，请主动联系客服'
-        #订单创建
-        try:
-            # print(f'卡密信息{card}')
-            with db.auto_commit_db():
-                new_order= Order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,card,None,None)
-                db.session.add(new_order)
-            # log('订单创建完毕')
-        except Exception as e:
-            log(e)
-            return '订单创建失败', 500         
-
-        ##构造data数据
-        data = {}
-        data['out_order_id'] = out_order_id
-        data['name'] = name
-        data['payment'] = payment
-        data['contact'] = contact
-        data['contact_txt'] = contact_txt
-        data['price'] = price
-        data['num'] = num
-        data['total_price'] = total_price
-        data['card'] = card
-        data['status'] = status
-        # 执行队列任务
-        # print('后台正在执行队列')
-        try:
-            task(data)  #为避免奔溃，特别设置
-        except Exception as e:
-            log(e)  #代表通知序列任务失败                                
-        
+        # print(f'卡密信息{card}')
+        new_order= Order(out_order_id,name,payment,contact,contact_txt,price,num,total_price,card,None,None)
+        db.session.add(new_order)
+        record_order(new_order.updatetime,num,total_price)  # 按天汇总，与订单同一事务
+
+    ##构造data数据
+    data = {}
+    data['out_order_id'] = out_order_id
+    data['name'] = name
+    data['payment'] = payment
+    data['contact'] = contact
+    data['contact_txt'] = contact_txt
+    data['price'] = price
+    data['num'] = num
+    data['total_price'] = total_price
+    data['card'] = card
+    data['status'] = status
+    return data
+
+def send_order(data,auto):
+    # 订单提交后调用：目录缓存失效并发送通知，通知失败不影响订单
+    if not data:
+        return
+    if auto:
+        catalog.invalidate()    # 库存变化，前台目录缓存失效
+    # 执行队列任务
+    # print('后台正在执行队列')
+    try:
+        task(data)  #为避免奔溃，特别设置
+    except Exception as e:
+        log(e)  #代表通知序列任务失败
 
 
 # 任务检测【主要】
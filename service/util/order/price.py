@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from functools import lru_cache
+
+# 批发价格：price_wholesale 格式 "9,100#9.9,8.8,7.7"
+# '#'前为数量分界(升序)，后为各档单价，单价比分界多一个：
+# 1~9件9.9，10~100件8.8，101件以上7.7；分界数量不限
+
+
+class PriceTiers(object):
+    def __init__(self, nums, prices):
+        self.slice = nums       # 原始分界文本，前台展示用
+        self.prices = prices    # 原始单价文本
+        self.bounds = [int(x) for x in nums]
+        self.values = [float(x) for x in prices]
+
+    def price(self, num):
+        # num <= 分界视为该档，bisect_left 即落入的档位
+        return self.values[bisect_left(self.bounds, num)]
+
+    def to_json(self):
+        nums = []
+        start = 1
+        for bound in self.bounds:
+            nums.append(str(start)+'~'+str(bound))
+            start = bound + 1
+        nums.append(str(start)+'~')
+        return {'nums': nums, 'prices': self.prices, 'slice': self.slice}
+
+
+@lru_cache(maxsize=1024)
+def parse_tiers(text):
+    """解析批发价格文本，格式错误或未设置返回None；按文本缓存，商品修改后自动重新解析"""
+    if not text or '#' not in text:
+        return None
+    try:
+        nums, prices = text.split('#', 1)
+        nums = [x.strip() for x in nums.split(',')]
+        prices = [x.strip() for x in prices.split(',')]
+        tiers = PriceTiers(nums, prices)
+    except ValueError:
+        return None
+    if len(tiers.values) != len(tiers.bounds) + 1 or tiers.bounds != sorted(tiers.bounds):
+        return None
+    return tiers
+
+
+def unit_price(shop, num):
+    """商品单价：未上架9999(不可购买)，有批发价按数量取档，否则原价"""
+    if not shop:
+        return 9999
+    if not shop.isactive:
+        return 0
+    tiers = parse_tiers(shop.price_wholesale)
+    if tiers:
+        return tiers.price(num)
+    return shop.price
@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from service.database.models import NotifyTask
+from service.api.db import db
+from service.util.timeutil import now
+from service.util.order.handle import fulfil_order
+
+# 日志记录
+from service.util.log import log
+
+# 持久化发卡队列：回调只负责验签入队，后台线程领取执行；基于数据表，SQLite可用且无需外部中间件
+QUEUE_WORKERS = int(os.getenv('NOTIFY_WORKERS', 4))    # 工作线程数
+MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 8))    # 超过后进入dead状态，需人工处理
+RETRY_BASE = int(os.getenv('NOTIFY_RETRY_BASE', 5))    # 重试退避基数，秒，指数增长
+RETRY_MAX = 600
+LEASE = int(os.getenv('NOTIFY_LEASE', 300))    # running超时未完成视为进程中断，允许重新领取
+POLL = 1    # 空闲时轮询间隔，秒
+
+wake = threading.Event()
+stats = {'enqueued': 0, 'done': 0, 'retry': 0, 'dead': 0}
+_finished = deque(maxlen=10000)    # 最近完成时间，用于计算吞吐
+_started = []
+
+
+def enqueue(out_order_id):
+    if not out_order_id:
+        return
+    try:
+        with db.auto_commit_db():
+            db.session.add(NotifyTask(out_order_id))
+        stats['enqueued'] += 1
+    except IntegrityError:
+        pass    # 重复回调，订单已在队列中
+    wake.set()
+
+
+def claim():
+    # 条件更新领取任务，影响行数为1才算领取成功，多线程/多进程不会重复执行
+    c_now = now()
+    task = NotifyTask.query.filter(NotifyTask.status.in_(['pending', 'running']), NotifyTask.run_at <= c_now).order_by(NotifyTask.run_at).first()
+    if not task:
+        return None
+    with db.auto_commit_db():
+        claimed = NotifyTask.query.filter_by(id=task.id, status=task.status, run_at=task.run_at).update(
+            {'status': 'running', 'attempts': task.attempts + 1, 'run_at': c_now + timedelta(seconds=LEASE), 'updatetime': c_now}, synchronize_session=False)
+    if not claimed:
+        return None
+    return task.id, task.out_order_id, task.attempts + 1
+
+
+def ack(task_id):
+    with db.auto_commit_db():
+        NotifyTask.query.filter_by(id=task_id).update({'status': 'done', 'last_error': None, 'updatetime': now()})
+    stats['done'] += 1
+    _finished.append(time.time())
+
+
+def fail(task_id, attempts, error):
+    c_now = now()
+    if attempts >= MAX_ATTEMPTS:
+        data = {'status': 'dead'}
+        stats['dead'] += 1
+    else:
+        delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+        data = {'status': 'pending', 'run_at': c_now + timedelta(seconds=delay)}
+        stats['retry'] += 1
+    data.update({'last_error': str(error)[:1000], 'updatetime': c_now})
+    with db.auto_commit_db():
+        NotifyTask.query.filter_by(id=task_id).update(data)
+
+
+def run_once():
+    task = claim()
+    if not task:
+        return False
+    task_id, out_order_id, attempts = task
+    try:
+        fulfil_order(out_order_id)
+    except Exception as e:
+        log(e)
+        fail(task_id, attempts, e)
+    else:
+        ack(task_id)
+    return True
+
+
+def work():
+    while True:
+        try:
+            busy = run_once()
+        except Exception as e:
+            log(e)  # 数据库异常等，稍后重试
+            busy = False
+        finally:
+            db.session.remove()
+        if not busy:
+            wake.wait(POLL)
+            wake.clear()
+
+
+def start_workers(num=QUEUE_WORKERS):
+    if _started:
+        return
+    for i in range(num):
+        t = threading.Thread(target=work, name=f'notify-worker-{i}', daemon=True)
+        t.start()
+        _started.append(t)
+
+
+def queue_stats():
+    # 队列监控：各状态数量、积压、最近一分钟吞吐
+    counts = dict(db.session.query(NotifyTask.status, func.count(NotifyTask.id)).group_by(NotifyTask.status).all())
+    since = time.time() - 60
+    return {
+        'workers': len(_started),
+        'depth': counts.get('pending', 0) + counts.get('running', 0),
+        'status': counts,
+        'per_minute': sum(1 for x in _finished if x >= since),
+        'since_start': stats,
+    }
+
+
+def purge(days=7):
+    # 清理已完成任务
+    with db.auto_commit_db():
+        NotifyTask.query.filter(NotifyTask.status == 'done', NotifyTask.updatetime < now() - timedelta(days=days)).delete(synchronize_session=False)
@@ -0,0 +1,102 @@
+import sqlite3
+from sqlalchemy import text
+from service.database.models import Card
+from service.api.db import db
+from service.util.card.stock import adjust_stock
+
+# 卡密原子领取：并发回调下同一张卡密只能被一个订单领取
+# SQLite 3.35+ 单条UPDATE在写锁内完成，PostgreSQL子查询加SKIP LOCKED，各事务领取互不重叠的行
+CLAIM_SQL = ('UPDATE card SET isused = :used WHERE isused = :unused AND id IN ('
+             'SELECT id FROM card WHERE prod_name = :name AND isused = :unused ORDER BY id LIMIT :num{lock}'
+             ') RETURNING id, card')
+CHUNK_SIZE = 500
+CLAIM_RETRY = 5
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _returning_sql():
+    name = _dialect()
+    if name == 'postgresql':
+        return text(CLAIM_SQL.format(lock=' FOR UPDATE SKIP LOCKED'))
+    if name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35, 0):
+        return text(CLAIM_SQL.format(lock=''))
+    return None
+
+
+def _claim_returning(sql, prod_name, num):
+    rows = db.session.execute(sql, {'used': True, 'unused': False, 'name': prod_name, 'num': num}).fetchall()
+    return [x[1] for x in sorted(rows)]     # RETURNING不保证顺序，按id排序一次取出卡密
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+def _mark_used(ids):
+    # 集合式批量更新，分块避免超出SQLite绑定参数上限(旧版本999)
+    count = 0
+    for chunk in _chunks(ids):
+        count += Card.query.filter(Card.id.in_(chunk), Card.isused == False).update({'isused': True}, synchronize_session=False)
+    return count
+
+
+def _skip_locked(dialect):
+    # MySQL 8.0、MariaDB 10.6起支持SKIP LOCKED；MariaDB版本号为10.x，不能按MySQL判断
+    version = dialect.server_version_info or (0,)
+    if getattr(dialect, '_is_mariadb', False):
+        return version >= (10, 6)
+    return version >= (8,)
+
+
+def _claim_for_update(prod_name, num):
+    # 不支持SKIP LOCKED时退化为普通FOR UPDATE（串行等待，结果同样正确）
+    query = db.session.query(Card.id, Card.card).filter(Card.prod_name == prod_name, Card.isused == False).order_by(Card.id).limit(num)
+    rows = query.with_for_update(skip_locked=_skip_locked(db.engine.dialect)).all()
+    _mark_used([x[0] for x in rows])
+    return [x[1] for x in rows]
+
+
+class ClaimConflict(Exception):
+    pass
+
+
+def _claim_optimistic(prod_name, num):
+    # 兜底方案：先查候选卡密，再以 WHERE isused=False 条件批量更新
+    # 影响行数与候选数一致才算全部领取成功，否则说明有并发领取，回滚后重试
+    rows = db.session.query(Card.id, Card.card).filter(Card.prod_name == prod_name, Card.isused == False).order_by(Card.id).limit(num).all()
+    if _mark_used([x[0] for x in rows]) != len(rows):
+        raise ClaimConflict(prod_name)
+    return [x[1] for x in rows]
+
+
+def claim_cards(prod_name, num):
+    """领取num张卡密，返回(卡密列表, 是否重复卡密)；重复卡密不标记已用，由调用方按数量重复发放
+
+    应在调用方写入订单的auto_commit_db内调用：每次尝试只是一个保存点，由调用方统一提交，
+    订单写入失败时领取随之回滚；单独调用时每次领取自行提交
+    """
+    first = Card.query.filter_by(prod_name=prod_name, isused=False).order_by(Card.id).first()
+    if not first:
+        return [], False
+    if first.reuse:
+        return [first.card], True
+    sql = _returning_sql()
+    for _ in range(CLAIM_RETRY):
+        try:
+            with db.auto_commit_db():   # 嵌套时为保存点，冲突只回滚本次尝试
+                if sql is not None:
+                    cards = _claim_returning(sql, prod_name, num)
+                elif _dialect() == 'mysql':
+                    cards = _claim_for_update(prod_name, num)
+                else:
+                    cards = _claim_optimistic(prod_name, num)
+                if cards:
+                    adjust_stock(prod_name, -len(cards))    # 库存计数与领取同一事务
+            return cards, False
+        except ClaimConflict:
+            continue
+    raise ClaimConflict(prod_name)
@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from sqlalchemy import text
+from service.api.db import db
+
+# 后台列表游标分页：按id定位(WHERE id < cursor ORDER BY id DESC LIMIT n)，翻到任意深度都只读取一页数据
+# 总数只用于展示，允许近似：无筛选时读数据库统计信息，其余按条件缓存COUNT结果
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+COUNT_TTL = int(os.getenv('PAGE_COUNT_TTL', 30))   # 秒，计数缓存时间
+
+_lock = threading.Lock()
+_counts = {}    # (表名, 筛选条件) ==> (过期时间, 数量)
+
+
+def page_size(value):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+
+
+def parse_cursor(value):
+    """游标为正整数id，未传返回None，格式错误抛出ValueError"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not str(value).isdigit():
+        raise ValueError(f'游标格式错误: {value!r}')
+    return int(value)
+
+
+def parse_flag(value):
+    """布尔筛选条件：接受true/false/1/0(含字符串)，未传返回None，其余抛出ValueError"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1'):
+        return True
+    if text in ('false', '0'):
+        return False
+    raise ValueError(f'布尔值格式错误: {value!r}')
+
+
+def keyset(query, column, cursor=None, size=PAGE_SIZE, desc=True):
+    """返回(本页行, 下一页游标)；游标为本页最后一行的id，没有下一页为None"""
+    if cursor is not None:
+        query = query.filter(column < cursor if desc else column > cursor)
+    query = query.order_by(column.desc() if desc else column.asc())
+    rows = query.limit(size + 1).all()     # 多取一行判断是否还有下一页
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, getattr(rows[-1], column.key)
+    return rows, None
+
+
+def _estimate(table):
+    # 数据库统计信息，无需扫表；SQLite没有统计信息返回None
+    name = db.engine.dialect.name
+    if name == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE relname = :table'
+    elif name == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table'
+    else:
+        return None
+    res = db.session.execute(text(sql), {'table': table}).scalar()
+    if res is None or res < 0:     # PostgreSQL未ANALYZE时为-1
+        return None
+    return int(res)
+
+
+def approx_count(query, table, filters=None):
+    """条件计数，结果缓存COUNT_TTL秒；filters为筛选条件dict，用作缓存键"""
+    filters = {k: v for k, v in (filters or {}).items() if v not in [None, '']}
+    key = (table, tuple(sorted((k, str(v)) for k, v in filters.items())))
+    entry = _counts.get(key)
+    now = time.time()
+    if entry and entry[0] > now:
+        return entry[1]
+    count = None if filters else _estimate(table)
+    if count is None:
+        count = query.order_by(None).count()
+    with _lock:
+        _counts[key] = (now + COUNT_TTL, count)
+    return count
+
+
+def invalidate_count(table=None):
+    with _lock:
+        for key in [x for x in _counts if table is None or x[0] == table]:
+            _counts.pop(key, None)
@@ -1,9 +1,37 @@
-from os import name
-from service.util.pay.hupijiao.xunhupay import payment
+import os
+import time
+import threading
 from service.database.models import Payment,Config
 
-def get_config(name):
+# 支付配置缓存：解析后的配置常驻内存，后台修改支付接口或网站设置时invalidate()
+# 多进程部署时各进程独立，TTL兜底
+CONFIG_TTL = int(os.getenv('PAY_CONFIG_TTL', 300))    # 秒
+version = 0
+_lock = threading.Lock()
+_configs = {}   # name ==> (版本号, 过期时间, 配置)
+
+
+def load_config(name):
     if name == 'web_url':
         return Config.query.filter_by(name = 'web_url').first().info    #返回URL
     # 支付渠道名称
-    return Payment.query.filter_by(name = name).first().all_json()['config']
\ No newline at end of file
+    return Payment.query.filter_by(name = name).first().all_json()['config']
+
+
+def get_config(name):
+    entry = _configs.get(name)
+    if entry and entry[0] == version and entry[1] > time.time():
+        return entry[2]
+    current = version
+    config = load_config(name)
+    with _lock:
+        if current == version:
+            _configs[name] = (current, time.time() + CONFIG_TTL, config)
+    return config
+
+
+def invalidate():
+    global version
+    with _lock:
+        version += 1
+        _configs.clear()
@@ -0,0 +1,21 @@
+import time
+import threading
+from service.util.pay import pay_config
+
+# 支付网关对象缓存：按(网关类, 参数)缓存已构造的对象，避免每次回调/下单都查库、解析配置、加载RSA密钥
+# 后台修改支付配置或网站地址时pay_config.invalidate()使版本号变化，旧对象自动作废
+_lock = threading.Lock()
+_clients = {}   # key ==> (配置版本号, 过期时间, 网关对象)
+
+
+def gateway(cls, *args, **kwargs):
+    key = (cls, args, tuple(sorted(kwargs.items())))
+    entry = _clients.get(key)
+    if entry and entry[0] == pay_config.version and entry[1] > time.time():
+        return entry[2]
+    version = pay_config.version
+    client = cls(*args, **kwargs)
+    with _lock:
+        if version == pay_config.version:
+            _clients[key] = (version, time.time() + pay_config.CONFIG_TTL, client)
+    return client
@@ -0,0 +1,67 @@
+import os
+import io
+import zlib
+import struct
+import hashlib
+from functools import lru_cache
+import qrcode
+import qrcode.image.svg
+
+# 支付二维码渲染：同一支付链接重复下单/刷新时直接返回缓存字节
+# 首次渲染固定掩码(跳过8种掩码的评分)，PNG由模块矩阵直接写出1位灰度图，不经过PIL逐格绘制
+QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 512))
+QR_BOX_SIZE = int(os.getenv('QR_BOX_SIZE', 8))   # 每个模块像素数，原为10
+QR_BORDER = 2
+QR_PNG_LEVEL = int(os.getenv('QR_PNG_LEVEL', 1))    # zlib压缩级别，黑白图1级体积已接近最小
+QR_MASK = os.getenv('QR_MASK_PATTERN', '0')    # 0~7任一掩码均符合规范，留空为逐个评分取最优(约慢4倍)
+QR_MAX_LEN = 1024   # 超长文本拒绝渲染
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def _make(text, image_factory=None):
+    qr = qrcode.QRCode(
+        version=None,   # 按内容自动选择最小版本
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=QR_BOX_SIZE,
+        border=QR_BORDER,
+        image_factory=image_factory,
+        mask_pattern=int(QR_MASK) if QR_MASK else None,
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+    return qr
+
+
+def _chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def png_bytes(matrix, box=QR_BOX_SIZE):
+    """模块矩阵(含边框，True为黑) ==> 1位灰度PNG，每个模块box×box像素"""
+    width = len(matrix) * box
+    pad = -width % 8
+    lines = []
+    for row in matrix:
+        bits = ''.join(('0' if x else '1') * box for x in row) + '1' * pad   # 1位灰度：0黑1白
+        lines.append((b'\x00' + int(bits, 2).to_bytes((width + pad) // 8, 'big')) * box)     # 行首0为不滤波
+    header = struct.pack('>IIBBBBB', width, width, 1, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header) + _chunk(b'IDAT', zlib.compress(b''.join(lines), QR_PNG_LEVEL)) + _chunk(b'IEND', b'')
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render(text, fmt='png'):
+    """返回二维码字节，bytes不可变，可在线程间共享"""
+    if fmt == 'svg':
+        buf = io.BytesIO()
+        _make(text, qrcode.image.svg.SvgPathImage).make_image().save(buf)
+        return buf.getvalue()
+    return png_bytes(_make(text).get_matrix())
+
+
+def qr_file(text):
+    # BytesIO基于bytes创建时共享缓冲区，不再复制一次，直接交给send_photo
+    return io.BytesIO(render(text))
+
+
+def qr_etag(text, fmt='png'):
+    return hashlib.md5(f'{fmt}:{QR_BOX_SIZE}:{QR_MASK}:{text}'.encode('utf-8')).hexdigest()
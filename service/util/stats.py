@@ -0,0 +1,76 @@
+import os
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from service.api.db import db
+from service.database.models import Order, DailyStats
+from service.util.timeutil import in_range
+
+# 后台统计：COUNT/SUM/GROUP BY 在数据库内完成，不再加载订单到内存
+# 按天汇总表daily_stats在下单时增量更新，年度、全部图表只需读取天数级别的行
+DAILY_STATS = os.getenv('DAILY_STATS', '1') == '1'     # 0为关闭汇总表，图表全部直接统计订单表
+
+PG_FORMATS = {'%Y-%m-%d %H': 'YYYY-MM-DD HH24', '%Y-%m-%d': 'YYYY-MM-DD', '%Y-%m': 'YYYY-MM'}
+
+
+def bucket(column, fmt):
+    """时间列按strftime格式分组的SQL表达式，兼容SQLite、MySQL、PostgreSQL"""
+    name = db.engine.dialect.name
+    if name == 'postgresql':
+        return func.to_char(column, PG_FORMATS[fmt])
+    if name == 'mysql':
+        return func.date_format(column, fmt)   # %Y %m %d %H 含义与strftime一致
+    return func.strftime(fmt, column)
+
+
+def series(column, value, group, label, since=None):
+    """按group粒度求和，按各组最早时间排序；返回(标签列表, 金额列表)，标签按label格式化"""
+    key = bucket(column, group)
+    query = db.session.query(func.min(column), func.sum(value))
+    query = in_range(query, column, since)
+    dates = []
+    prices = []
+    for first, total in query.group_by(key).order_by(func.min(column)):
+        dates.append(first.strftime(label))
+        prices.append(round(float(total or 0), 2))
+    return dates, prices
+
+
+def order_series(group, label, since=None):
+    # 日粒度及以上优先读取汇总表
+    if DAILY_STATS and group != '%Y-%m-%d %H':
+        return series(DailyStats.day, DailyStats.income, group, label, since.date() if since else None)
+    return series(Order.updatetime, Order.total_price, group, label, since)
+
+
+def record_order(when, num, total_price):
+    """下单时调用，与订单写入处于同一事务"""
+    if not DAILY_STATS:
+        return
+    day = when.date()
+    values = {'orders': DailyStats.orders + 1, 'num': DailyStats.num + num, 'income': DailyStats.income + total_price}
+    if DailyStats.query.filter_by(day=day).update(values, synchronize_session=False):
+        return
+    try:
+        with db.auto_commit_db():   # 保存点内插入，并发时当天记录已被其他订单创建则改为更新
+            db.session.add(DailyStats(day, 1, num, total_price))
+    except IntegrityError:
+        DailyStats.query.filter_by(day=day).update(values, synchronize_session=False)
+
+
+def unrecord_order(when, num, total_price):
+    """删除单个订单时调用，与删除处于同一事务"""
+    if not DAILY_STATS or when is None:
+        return
+    values = {'orders': DailyStats.orders - 1, 'num': DailyStats.num - num, 'income': DailyStats.income - total_price}
+    DailyStats.query.filter_by(day=when.date()).update(values, synchronize_session=False)
+    DailyStats.query.filter(DailyStats.day == when.date(), DailyStats.orders <= 0).delete(synchronize_session=False)  # 当天已无订单
+
+
+def rebuild_daily_stats():
+    """按订单表重建汇总表：升级旧库、删除订单或恢复备份后调用"""
+    key = bucket(Order.updatetime, '%Y-%m-%d')
+    rows = db.session.query(key, func.count(Order.id), func.sum(Order.num), func.sum(Order.total_price)).group_by(key).all()
+    with db.auto_commit_db():
+        DailyStats.query.delete(synchronize_session=False)
+        db.session.add_all([DailyStats(datetime.strptime(day, '%Y-%m-%d').date(), orders, int(num or 0), float(income or 0)) for day, orders, num, income in rows])
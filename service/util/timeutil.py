@@ -0,0 +1,78 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+# 统一时间来源：数据库保存不带时区的本地时间(默认北京时间UTC+8)，与历史数据一致
+# 所有"当前时间"都通过now()在调用时取值，不得在模块导入时求值；测试可用freeze()冻结时钟
+TZ_HOURS = int(os.getenv('TZ_HOURS', 8))
+TZ = timezone(timedelta(hours=TZ_HOURS))
+
+_frozen = []    # freeze()冻结的时间栈，栈顶生效
+
+
+def aware_now():
+    """带时区的当前时间"""
+    if _frozen:
+        return _frozen[-1]
+    return datetime.now(TZ)
+
+
+def now():
+    """不带时区的本地时间，写库、查询统一使用；可直接作为Column(default=now)"""
+    return aware_now().replace(tzinfo=None)
+
+
+def to_aware(value):
+    """库中读出的本地时间 ==> 带时区时间；已带时区的转换到本地时区"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=TZ)
+    return value.astimezone(TZ)
+
+
+def to_local(value):
+    """任意时区时间 ==> 不带时区的本地时间，用于写库或比较"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(TZ).replace(tzinfo=None)
+
+
+def day_start(value=None):
+    value = value or now()
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def window(days=0, hours=0, end=None):
+    """最近一段时间的[开始, 结束)区间，结束默认为当前时间"""
+    end = end or now()
+    return end - timedelta(days=days, hours=hours), end
+
+
+def day_range(start=None, end=None):
+    """按天筛选：[开始当天0点, 结束次日0点)，参数可为空"""
+    return (day_start(start) if start else None), (day_start(end) + timedelta(days=1) if end else None)
+
+
+def in_range(query, column, start=None, end=None):
+    """时间列区间筛选，只比较列本身(不套函数)，可走索引；start含，end不含"""
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+    return query
+
+
+class freeze(object):
+    """冻结时钟：with freeze(datetime(2021, 1, 1)) as clock: clock.tick(days=7)"""
+
+    def __init__(self, value):
+        self.value = to_aware(value)
+
+    def tick(self, **kwargs):
+        self.value = self.value + timedelta(**kwargs)
+        _frozen[-1] = self.value
+
+    def __enter__(self):
+        _frozen.append(self.value)
+        return self
+
+    def __exit__(self, *args):
+        _frozen.pop()
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import PROD_NAME, out_order_id
+from service.api.db import db
+from service.database.models import TempOrder, TempOrderArchive
+from service.util import auto_task
+from service.util.timeutil import freeze
+
+START = datetime(2021, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def gc(shop, monkeypatch):
+    monkeypatch.setattr(auto_task, 'GC_BATCH', 3)
+    monkeypatch.setattr(auto_task, 'GC_PAUSE', 0)
+    monkeypatch.setattr(auto_task, 'TMP_ARCHIVE', True)
+    return shop
+
+
+def add_tmp_order(i, paid, shop):
+    db.session.add(TempOrder(out_order_id(i), PROD_NAME, 'test', 'test@example.com', None, 1, paid, None, shop=shop))
+    db.session.commit()
+
+
+def test_clean_tmp_order_deletes_old_rows_and_archives_paid(gc):
+    # 按创建距今时间：6天以上删除(与旧版 .days > 5 一致)，5天23小时保留
+    ages = [(timedelta(days=9), True), (timedelta(days=8), False), (timedelta(days=7), True), (timedelta(days=6), True),
+            (timedelta(days=6), False), (timedelta(days=6, hours=1), False), (timedelta(days=6, hours=2), True),
+            (timedelta(days=5, hours=23), True), (timedelta(days=1), False), (timedelta(0), True)]
+    end = START + timedelta(days=10)
+    for i, (age, paid) in enumerate(ages):
+        with freeze(end - age):
+            add_tmp_order(i, paid, gc)
+    db.session.remove()
+    with freeze(end):
+        auto_task.clean_tmp_order()
+    expired = [i for i, (age, _) in enumerate(ages) if age >= timedelta(days=6)]
+    paid = [out_order_id(i) for i in expired if ages[i][1]]
+    assert sorted(x.out_order_id for x in TempOrder.query.all()) == [out_order_id(i) for i in range(len(ages)) if i not in expired]
+    assert auto_task.gc_stats['last_deleted'] == len(expired) == 7
+    assert auto_task.gc_stats['last_archived'] == len(paid) == 4
+    archives = TempOrderArchive.query.order_by(TempOrderArchive.id).all()
+    assert sum(x.count for x in archives) == 4 and len(archives) >= 2     # 每批一行，GC_BATCH=3
+    records = [r for x in archives for r in x.records()]
+    assert sorted(r['out_order_id'] for r in records) == sorted(paid)
+    assert all(x.start_time <= x.end_time <= end - timedelta(days=6) for x in archives)
+
+
+def test_archive_can_be_disabled(gc, monkeypatch):
+    monkeypatch.setattr(auto_task, 'TMP_ARCHIVE', False)
+    with freeze(START):
+        add_tmp_order(0, True, gc)
+    with freeze(START + timedelta(days=30)):
+        auto_task.clean_tmp_order()
+    assert TempOrder.query.count() == 0 and TempOrderArchive.query.count() == 0
@@ -0,0 +1,50 @@
+import csv
+import gzip
+from datetime import datetime
+
+import pytest
+
+from conftest import PROD_NAME, add_cards, out_order_id
+from service.api.db import db
+from service.database.models import Card, Order
+from service.util import bulk
+from service.util.backup.export import CARD_FIELDS, ORDER_FIELDS
+
+
+@pytest.fixture(autouse=True)
+def backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk, 'BACKUP_PATH', str(tmp_path))
+    return tmp_path
+
+
+def read_archive(path):
+    with gzip.open(path, 'rt', encoding='utf-8-sig', newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_card_archive_has_single_id_column(shop):
+    add_cards(12)
+    deleted, path = bulk.bulk_delete(Card, CARD_FIELDS, ids=list(range(1, 11)), archive=True, chunk=4)
+    rows = read_archive(path)
+    assert deleted == 10 and Card.query.count() == 2
+    assert rows[0] == CARD_FIELDS and rows[0].count('id') == 1
+    assert [int(x[0]) for x in rows[1:]] == list(range(1, 11))
+    assert rows[1][CARD_FIELDS.index('card')] == 'CARD-0'
+
+
+def test_order_archive_prepends_id(database):
+    db.session.add_all([Order(out_order_id(i), PROD_NAME, 'test', 'test@example.com', None, 1, 1, 1, 'CARD', True, datetime(2021, 1, 1)) for i in range(7)])
+    db.session.commit()
+    deleted, path = bulk.bulk_delete(Order, ORDER_FIELDS, archive=True, chunk=3)
+    rows = read_archive(path)
+    assert deleted == 7 and Order.query.count() == 0
+    assert rows[0] == ['id'] + ORDER_FIELDS
+    assert [x[1] for x in rows[1:]] == [out_order_id(i) for i in range(7)]
+
+
+def test_criteria_delete_without_archive(shop):
+    add_cards(9)
+    db.session.execute(Card.__table__.update().where(Card.id <= 5).values(isused=True))
+    db.session.commit()
+    assert bulk.bulk_delete(Card, CARD_FIELDS, criteria=(Card.isused == True,), chunk=2) == (5, None)
+    assert sorted(x.id for x in Card.query.all()) == [6, 7, 8, 9]
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import PROD_NAME, add_cards, out_order_id
+from service.api.db import db
+from service.database.models import Card, Order, TempOrder
+from service.util.order import handle
+
+
+@pytest.fixture
+def orders(shop, monkeypatch):
+    monkeypatch.setattr(handle, 'task', lambda data: None)     # 关闭通知渠道
+    add_cards(20)
+    db.session.add_all([TempOrder(out_order_id(i), PROD_NAME, 'test', 'test@example.com', None, 1, False, None, shop=shop) for i in range(10)])
+    db.session.commit()
+    db.session.remove()
+
+
+def fulfil(x):
+    try:
+        handle.fulfil_order(x)
+        return None
+    except RuntimeError as e:
+        return e
+    finally:
+        db.session.remove()
+
+
+def test_repeated_tasks_create_one_order(orders):
+    ids = [out_order_id(i) for i in range(10)] * 4    # 重复回调、租约过期重新领取
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(fulfil, ids))
+    for x in set(ids):     # 被其他任务领取的订单，重试时直接返回
+        assert fulfil(x) is None
+    assert Order.query.count() == 10
+    assert len({o.card for o in Order.query.all()}) == 10
+
+
+def test_failed_insert_rolls_back_claim(orders, monkeypatch):
+    def broken(*args):
+        raise RuntimeError('写入失败')
+    monkeypatch.setattr(handle, 'record_order', broken)     # 订单写入事务中途失败
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            handle.fulfil_order(out_order_id(0))
+        db.session.remove()
+    assert Card.query.filter_by(isused=True).count() == 0   # 重试多次也不会泄漏卡密
+    assert Order.query.count() == 0
+    assert TempOrder.query.filter_by(out_order_id=out_order_id(0)).first().status is False   # 不会显示已支付，队列重试时可再次领取
+    monkeypatch.undo()
+    monkeypatch.setattr(handle, 'task', lambda data: None)
+    assert fulfil(out_order_id(0)) is None
+    assert Order.query.filter_by(out_order_id=out_order_id(0)).first().card == 'CARD-0'
+    assert Card.query.filter_by(isused=True).count() == 1
+
+
+def test_crashed_worker_leaves_order_retryable(orders, monkeypatch):
+    def crash(*args):
+        raise SystemExit    # 发卡进程在写入订单时退出
+    monkeypatch.setattr(handle, 'record_order', crash)
+    with pytest.raises(SystemExit):
+        handle.fulfil_order(out_order_id(0))
+    db.session.remove()
+    assert TempOrder.query.filter_by(out_order_id=out_order_id(0)).first().status is False
+    assert Card.query.filter_by(isused=True).count() == 0
+    monkeypatch.undo()
+    monkeypatch.setattr(handle, 'task', lambda data: None)
+    assert fulfil(out_order_id(0)) is None    # 重试任务可以接手，不会一直报正在发卡
+    assert Order.query.filter_by(out_order_id=out_order_id(0)).count() == 1
+
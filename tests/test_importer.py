@@ -0,0 +1,41 @@
+import io
+import time
+
+from conftest import PROD_NAME, add_cards
+from service.api.db import db
+from service.database.models import Card
+from service.util.card import importer
+
+
+def wait_job(job_id, timeout=10):
+    deadline = time.time() + timeout
+    while not importer.import_status(job_id)['done']:
+        assert time.time() < deadline, '导入超时'
+        time.sleep(0.02)
+    return importer.import_status(job_id)
+
+
+def test_import_dedupes_against_stock_and_upload(shop, monkeypatch):
+    monkeypatch.setattr(importer, 'IMPORT_BATCH', 3)
+    add_cards(2)    # CARD-0、CARD-1已在库存中
+    lines = ['CARD-0', 'A', '', 'B', 'A', 'C', 'D', 'CARD-1', 'E']
+    stats = list(importer.import_cards(PROD_NAME, iter(lines), batch=3))
+    assert stats[-1] == {'read': 9, 'inserted': 5, 'duplicate': 3, 'blank': 1, 'done': True}
+    assert len(stats) == 2     # 满一批回报一次
+    assert Card.query.filter_by(prod_name=PROD_NAME).count() == 7
+
+
+def test_job_finishes_after_upload_stream_is_closed(shop):
+    stream = io.BytesIO('\ufeffX1\r\nX2\r\nX1\r\n'.encode('utf-8'))
+    job_id = importer.start_import(PROD_NAME, stream)
+    stream.close()      # 请求结束、浏览器断开后上传流关闭，导入照常完成
+    info = wait_job(job_id)
+    assert info['inserted'] == 2 and info['duplicate'] == 1 and 'error' not in info
+    db.session.remove()
+    assert sorted(x.card for x in Card.query.all()) == ['X1', 'X2']
+
+
+def test_csv_job_uses_first_column(shop):
+    info = wait_job(importer.start_import(PROD_NAME, io.BytesIO(b'K1,note\nK2,note\n'), csv_mode=True))
+    assert info['inserted'] == 2
+    assert importer.import_status('missing') is None
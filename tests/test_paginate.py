@@ -0,0 +1,53 @@
+import pytest
+
+from conftest import PROD_NAME, add_cards
+from service.database.models import Card
+from service.util import paginate
+
+
+@pytest.mark.parametrize('value, expected', [(None, None), ('', None), (5, 5), ('17', 17), ('0', 0)])
+def test_parse_cursor(value, expected):
+    assert paginate.parse_cursor(value) == expected
+
+
+@pytest.mark.parametrize('value', ['abc', '-1', '1.5', 1.5, True, '1 OR 1=1'])
+def test_parse_cursor_rejects_malformed(value):
+    with pytest.raises(ValueError):
+        paginate.parse_cursor(value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None), ('', None), (True, True), (False, False), (1, True), (0, False),
+    ('true', True), ('FALSE', False), ('1', True), ('0', False),
+])
+def test_parse_flag(value, expected):
+    assert paginate.parse_flag(value) is expected
+
+
+@pytest.mark.parametrize('value', ['yes', 'no', 2, 'null'])
+def test_parse_flag_rejects_other_values(value):
+    with pytest.raises(ValueError):
+        paginate.parse_flag(value)
+
+
+def test_keyset_walks_every_row_once(shop):
+    add_cards(45)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = paginate.keyset(Card.query, Card.id, cursor, 20, desc=False)
+        seen.extend(x.id for x in rows)
+        if cursor is None:
+            break
+    assert seen == sorted(seen) and len(set(seen)) == 45
+    rows, cursor = paginate.keyset(Card.query, Card.id, None, 20)
+    assert rows[0].id == max(seen) and len(rows) == 20
+
+
+def test_count_cache_is_invalidated(shop):
+    add_cards(3)
+    query = Card.query.filter(Card.prod_name == PROD_NAME)
+    assert paginate.approx_count(query, 'card', {'prod_name': PROD_NAME}) == 3
+    add_cards(2, prefix='NEW-')
+    assert paginate.approx_count(query, 'card', {'prod_name': PROD_NAME}) == 3     # 缓存期内
+    paginate.invalidate_count('card')
+    assert paginate.approx_count(query, 'card', {'prod_name': PROD_NAME}) == 5
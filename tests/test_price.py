@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+from hypothesis import given, strategies as st
+
+from service.util.order.price import parse_tiers, unit_price
+
+
+def linear_price(bounds, prices, num):
+    # 逐档比较的参照实现：num <= 分界即落入该档
+    for bound, price in zip(bounds, prices):
+        if num <= bound:
+            return price
+    return prices[-1]
+
+
+def legacy_price(pw, num):
+    # 旧版TempOrder.__cal_price__的2/3档逻辑
+    len_pifa = len(pw.split('#')[0].split(','))
+    if len_pifa == 1:
+        if num > int(pw.split('#')[0]):
+            return pw.split('#')[1].split(',')[1]
+        return pw.split('#')[1].split(',')[0]
+    if num <= int(pw.split('#')[0].split(',')[0]):
+        return pw.split('#')[1].split(',')[0]
+    elif num > int(pw.split('#')[0].split(',')[1]):
+        return pw.split('#')[1].split(',')[2]
+    return pw.split('#')[1].split(',')[1]
+
+
+prices = st.decimals(min_value='0.01', max_value='999', places=2).map(str)
+
+
+@st.composite
+def tiers(draw, min_size=1, max_size=8):
+    bounds = sorted(draw(st.sets(st.integers(1, 100000), min_size=min_size, max_size=max_size)))
+    values = draw(st.lists(prices, min_size=len(bounds) + 1, max_size=len(bounds) + 1))
+    return bounds, values
+
+
+def text(bounds, values):
+    return ','.join(map(str, bounds)) + '#' + ','.join(values)
+
+
+def near_bounds(bounds):
+    # 随机数量，并覆盖每个分界两侧
+    return st.one_of(st.integers(1, 200000), st.sampled_from([x + d for x in bounds for d in (-1, 0, 1) if x + d > 0]))
+
+
+@given(st.data())
+def test_matches_linear_scan(data):
+    bounds, values = data.draw(tiers())
+    num = data.draw(near_bounds(bounds))
+    assert parse_tiers(text(bounds, values)).price(num) == float(linear_price(bounds, values, num))
+
+
+@given(st.data())
+def test_matches_legacy_two_and_three_tiers(data):
+    bounds, values = data.draw(tiers(max_size=2))
+    num = data.draw(near_bounds(bounds))
+    pw = text(bounds, values)
+    assert parse_tiers(pw).price(num) == float(legacy_price(pw, num))
+
+
+@given(tiers())
+def test_to_json_ranges_cover_every_tier(case):
+    bounds, values = case
+    info = parse_tiers(text(bounds, values)).to_json()
+    assert len(info['nums']) == len(values) and info['prices'] == values
+    assert info['nums'][0].startswith('1~') and info['nums'][-1] == str(bounds[-1] + 1) + '~'
+
+
+def test_four_tiers_use_tokens_not_characters():
+    # 旧版4档按字符取分界，10/20/30被当成1/0/2
+    assert parse_tiers('10,20,30#4,3,2,1').price(25) == 2.0
+    assert parse_tiers('10,20,30#4,3,2,1').price(31) == 1.0
+
+
+@pytest.mark.parametrize('bad', ['', None, '9', '9#1', '9,a#1,2,3', '100,9#1,2,3', '9#1,2,3'])
+def test_malformed_tiers_are_ignored(bad):
+    assert parse_tiers(bad) is None
+
+
+def test_unit_price_falls_back_to_base_price():
+    shop = SimpleNamespace(isactive=True, price=5.0, price_wholesale='9,a#1,2,3')
+    assert unit_price(shop, 3) == 5.0
+    shop.price_wholesale = '9#2,1'
+    assert unit_price(shop, 10) == 1.0
+    assert unit_price(None, 1) == 9999
+    assert unit_price(SimpleNamespace(isactive=False), 1) == 0
@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+from service.util import qr
+
+Image = pytest.importorskip('PIL.Image')
+
+URLS = ['https://qr.alipay.com/bax03431ljhokirwl38f00a7', 'weixin://wxpay/bizpayurl?pr=' + 'x' * 120, '中文支付链接']
+
+
+@pytest.mark.parametrize('text', URLS)
+@pytest.mark.parametrize('mask', ['0', '5', ''])
+def test_png_matches_qrcode_pil_rendering(text, mask, monkeypatch):
+    monkeypatch.setattr(qr, 'QR_MASK', mask)
+    code = qr._make(text)
+    expected = code.make_image(fill_color='black', back_color='white').convert('1')
+    actual = Image.open(io.BytesIO(qr.png_bytes(code.get_matrix())))
+    actual.load()
+    assert actual.mode == '1' and actual.size == expected.size == (len(code.get_matrix()) * qr.QR_BOX_SIZE,) * 2
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_render_is_cached_and_handed_off_without_copy():
+    qr.render.cache_clear()
+    first = qr.render(URLS[0])
+    assert qr.render(URLS[0]) is first and qr.render.cache_info().hits == 1
+    assert qr.qr_file(URLS[0]).getvalue() == first
+    assert qr.render(URLS[0], 'svg').startswith(b'<?xml')
+
+
+def test_etag_depends_on_format_and_text():
+    tags = {qr.qr_etag(URLS[0]), qr.qr_etag(URLS[0], 'svg'), qr.qr_etag(URLS[1])}
+    assert len(tags) == 3 and qr.qr_etag(URLS[0]) == qr.qr_etag(URLS[0])
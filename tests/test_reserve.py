@@ -0,0 +1,83 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import PROD_NAME, add_cards
+from service.api.db import db
+from service.database.models import Card
+from service.util.order import reserve
+
+
+def claim_all(claims, workers=16):
+    conflicts = []
+
+    def claim(_):
+        try:
+            return reserve.claim_cards(PROD_NAME, 1)[0]
+        except reserve.ClaimConflict as e:
+            conflicts.append(e)     # 重试耗尽，由发卡队列稍后重试
+            return []
+        finally:
+            db.session.remove()
+    with ThreadPoolExecutor(workers) as pool:
+        issued = [x for cards in pool.map(claim, range(claims)) for x in cards]
+    return issued, conflicts
+
+
+@pytest.mark.parametrize('returning', [True, False])
+def test_concurrent_claims_never_share_a_card(shop, monkeypatch, returning):
+    if not returning:
+        monkeypatch.setattr(reserve, '_returning_sql', lambda: None)   # 条件更新兜底方案
+    add_cards(150)
+    issued, conflicts = claim_all(200)
+    assert not [k for k, v in Counter(issued).items() if v > 1]
+    assert len(issued) == Card.query.filter_by(isused=True).count()     # 冲突回滚，不会有标记已用却未发出的卡密
+    if returning:
+        assert not conflicts and len(issued) == 150
+    else:
+        assert len(issued) == 150 or len(issued) + len(conflicts) == 200    # 未发完时每次领取要么成功要么报告冲突
+
+
+def test_claim_takes_cards_in_id_order(shop):
+    add_cards(5)
+    cards, reuse = reserve.claim_cards(PROD_NAME, 3)
+    assert cards == ['CARD-0', 'CARD-1', 'CARD-2'] and not reuse
+    assert reserve.claim_cards(PROD_NAME, 5)[0] == ['CARD-3', 'CARD-4']
+    assert reserve.claim_cards(PROD_NAME, 1) == ([], False)
+
+
+def test_reuse_card_is_not_marked_used(shop):
+    add_cards(1, reuse=True)
+    assert reserve.claim_cards(PROD_NAME, 3) == (['CARD-0'], True)
+    assert Card.query.filter_by(isused=True).count() == 0
+
+
+@pytest.mark.parametrize('returning', [True, False])
+def test_claim_rolls_back_with_caller(shop, monkeypatch, returning):
+    if not returning:
+        monkeypatch.setattr(reserve, '_returning_sql', lambda: None)
+    add_cards(3)
+    with pytest.raises(RuntimeError):
+        with db.auto_commit_db():
+            assert reserve.claim_cards(PROD_NAME, 2)[0] == ['CARD-0', 'CARD-1']
+            raise RuntimeError('订单写入失败')
+    db.session.remove()
+    assert Card.query.filter_by(isused=True).count() == 0
+    with db.auto_commit_db():
+        assert reserve.claim_cards(PROD_NAME, 2)[0] == ['CARD-0', 'CARD-1']
+    db.session.remove()
+    assert Card.query.filter_by(isused=True).count() == 2
+
+
+@pytest.mark.parametrize('version, mariadb, expected', [
+    ((5, 7, 30), False, False),
+    ((8, 0, 21), False, True),
+    ((10, 5, 9), True, False),
+    ((10, 6, 4), True, True),
+    (None, False, False),
+])
+def test_skip_locked_by_server_version(version, mariadb, expected):
+    dialect = SimpleNamespace(server_version_info=version, _is_mariadb=mariadb)
+    assert reserve._skip_locked(dialect) is expected
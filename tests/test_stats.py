@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import PROD_NAME, out_order_id
+from service.api.db import db
+from service.database.models import DailyStats, Order
+from service.util import stats
+
+DAYS = [datetime(2021, 3, 1, 9), datetime(2021, 3, 1, 23, 59), datetime(2021, 3, 2, 0, 1)]
+
+
+@pytest.fixture
+def daily(database, monkeypatch):
+    monkeypatch.setattr(stats, 'DAILY_STATS', True)
+
+
+def add_order(i, when, num, total_price):
+    with db.auto_commit_db():
+        order = Order(out_order_id(i), PROD_NAME, 'test', 'test@example.com', None, total_price, num, total_price, 'CARD', True, when)
+        db.session.add(order)
+        stats.record_order(order.updatetime, num, total_price)
+    return order
+
+
+def snapshot():
+    return sorted((x.day, x.orders, x.num, round(x.income, 2)) for x in DailyStats.query.all())
+
+
+def test_incremental_stats_match_rebuild(daily):
+    for i, when in enumerate(DAYS):
+        add_order(i, when, i + 1, 1.5 * (i + 1))
+    incremental = snapshot()
+    stats.rebuild_daily_stats()
+    assert incremental == snapshot() == [(DAYS[0].date(), 2, 3, 4.5), (DAYS[2].date(), 1, 3, 4.5)]
+
+
+def test_unrecord_only_touches_the_order_day(daily):
+    orders = [add_order(i, when, 2, 3.0) for i, when in enumerate(DAYS)]
+    for target in [orders[1], orders[2]]:
+        with db.auto_commit_db():
+            Order.query.filter_by(id=target.id).delete()
+            stats.unrecord_order(target.updatetime, target.num, target.total_price)
+    incremental = snapshot()
+    stats.rebuild_daily_stats()
+    assert incremental == snapshot() == [(DAYS[0].date(), 1, 2, 3.0)]    # 当天订单删完不留空行
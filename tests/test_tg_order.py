@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from conftest import PROD_NAME, add_cards
+from service.api.db import db
+from service.database.models import Card, DailyStats, Order
+from service.tg import tg_faka
+from service.tg.watcher import PayWatcher
+from service.util import stats
+from service.util.catalog import catalog
+
+
+@pytest.fixture
+def sent(shop, monkeypatch):
+    messages = []
+    monkeypatch.setattr(tg_faka, 'send_tg_msg', lambda chat_id, message: messages.append((chat_id, message)))
+    monkeypatch.setattr(stats, 'DAILY_STATS', True)
+    return messages
+
+
+def bot_order(i):
+    return {'out_order_id': f'TG_{i:024d}', 'name': PROD_NAME, 'price': '9.9', 'payment': '易支付', 'contact': 472835979, 'contact_txt': 'buyer'}
+
+
+def test_paid_bot_order_delivers_card(sent):
+    add_cards(3)
+    watcher = PayWatcher(interval=0.01, timeout=2, workers=2)
+    watcher.start(lambda data: True, tg_faka.make_order)    # 网关返回已支付，走真实发卡流程
+    version = catalog.version
+    watcher.watch(bot_order(1))
+    deadline = time.time() + 5
+    while watcher.pending():
+        assert time.time() < deadline
+        time.sleep(0.01)
+    db.session.remove()
+    order = Order.query.filter_by(out_order_id=bot_order(1)['out_order_id']).one()
+    assert order.card == 'CARD-0' and Card.query.filter_by(isused=True).count() == 1
+    assert watcher.stats['paid'] == 1 and watcher.stats['error'] == 0
+    assert len(sent) == 1 and sent[0][0] == 472835979
+    assert 'CARD-0' in sent[0][1] and order.updatetime.strftime('%Y-%m-%d %H:%M:%S') in sent[0][1]
+    assert catalog.version > version    # 库存变化，前台目录缓存失效
+    day = DailyStats.query.one()
+    assert (day.orders, day.num, day.income) == (1, 1, 9.9)
+
+
+def test_repeated_make_order_is_idempotent(sent):
+    add_cards(3)
+    tg_faka.make_order(bot_order(2))
+    tg_faka.make_order(bot_order(2))
+    assert Order.query.count() == 1 and Card.query.filter_by(isused=True).count() == 1 and len(sent) == 1
+
+
+def test_out_of_stock_sends_nothing(sent):
+    tg_faka.make_order(bot_order(3))
+    assert Order.query.count() == 0 and not sent
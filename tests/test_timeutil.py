@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import PROD_NAME, out_order_id
+from service.api.db import db
+from service.database.models import Order
+from service.util import stats, timeutil
+from service.util.timeutil import freeze, now, window
+
+START = datetime(2021, 1, 1, 12, 0, 0)
+
+
+def test_freeze_and_tick():
+    with freeze(START) as clock:
+        assert now() == START and timeutil.aware_now().utcoffset() == timedelta(hours=timeutil.TZ_HOURS)
+        clock.tick(days=1, hours=2)
+        assert now() == START + timedelta(days=1, hours=2)
+        with freeze(datetime(2020, 1, 1)):     # 嵌套冻结，退出后恢复外层
+            assert now() == datetime(2020, 1, 1)
+        assert now() == START + timedelta(days=1, hours=2)
+    assert now() != START + timedelta(days=1, hours=2)
+
+
+def test_window_and_day_range():
+    with freeze(START):
+        assert window(days=7) == (START - timedelta(days=7), START)
+        assert window(hours=3, end=datetime(2021, 1, 2)) == (datetime(2021, 1, 1, 21), datetime(2021, 1, 2))
+        assert timeutil.day_start() == datetime(2021, 1, 1)
+    assert timeutil.day_range(START, START) == (datetime(2021, 1, 1), datetime(2021, 1, 2))
+    assert timeutil.day_range() == (None, None)
+
+
+def test_timezone_conversion():
+    utc = datetime(2021, 1, 1, 4, tzinfo=timezone.utc)
+    local = timeutil.to_local(utc)
+    assert local == datetime(2021, 1, 1, 4) + timedelta(hours=timeutil.TZ_HOURS)
+    assert timeutil.to_local(local) == local
+    assert timeutil.to_aware(local) == utc
+
+
+def add_order(i, when, total_price):
+    db.session.add(Order(out_order_id(i), PROD_NAME, 'test', 'test@example.com', None, total_price, 1, total_price, 'CARD', True, when))
+    db.session.commit()
+
+
+def test_in_range_includes_start_excludes_end(database):
+    for i, hours in enumerate([0, 1, 2]):
+        add_order(i, START + timedelta(hours=hours), 1.0)
+    query = timeutil.in_range(Order.query, Order.updatetime, START, START + timedelta(hours=2))
+    assert query.count() == 2
+    assert timeutil.in_range(Order.query, Order.updatetime).count() == 3
+
+
+def expect(days, orders):
+    since = window(days=days)[0] if days else None
+    return round(sum(p for when, p in orders if since is None or when >= since), 2)
+
+
+def check(orders):
+    for days in [7, 30, 0]:
+        since = window(days=days)[0] if days else None
+        dates, prices = stats.order_series('%Y-%m-%d', '%Y-%m-%d', since)
+        assert round(sum(prices), 2) == expect(days, orders), (days, dates, prices)
+        assert dates == sorted(dates)
+
+
+@pytest.mark.parametrize('daily', [False, True])
+def test_stats_windows_follow_clock(database, monkeypatch, daily):
+    # 冻结时钟模拟进程长时间运行，近7天/30天/全部统计区间随当前时间移动
+    monkeypatch.setattr(stats, 'DAILY_STATS', daily)
+    with freeze(START) as clock:
+        orders = []
+        for i, (days, price) in enumerate([(1, 1.5), (3, 2.0), (10, 4.0), (40, 8.0), (400, 16.0)]):
+            when = now() - timedelta(days=days)
+            add_order(i, when, price)
+            orders.append((when, price))
+        add_order(100, None, 32.0)     # 未传时间，取冻结时钟
+        assert Order.query.filter_by(out_order_id=out_order_id(100)).first().updatetime == START
+        orders.append((START, 32.0))
+        stats.rebuild_daily_stats()
+        check(orders)
+
+        clock.tick(days=30)     # 进程运行30天后，窗口应随之移动
+        for i, days in enumerate([2, 20]):
+            when = now() - timedelta(days=days)
+            add_order(200 + i, when, 64.0)
+            orders.append((when, 64.0))
+        stats.rebuild_daily_stats()
+        check(orders)
+        assert expect(7, orders) == 64.0 and expect(30, orders) == 160.0